@@ -0,0 +1,254 @@
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+
+from random import Random
+from time import perf_counter
+
+from board import Board
+from engine import Engine
+import placements
+from replay import ReplayPlayer
+from shapes import CELL_CODES
+from tetromino import Tetromino
+
+from config import BOARD_SIZE, TETROMINOS
+
+
+def synthetic_boards(count: int, seed: int = 0, max_height: int = 10) -> list[Board]:
+    """Поля со случайной стопкой: в каждой строке одна-две дыры"""
+    rng = Random(seed)
+    width, height = BOARD_SIZE
+    boards = []
+    for _ in range(count):
+        board = Board(BOARD_SIZE)
+        cells = []
+        for y in range(height - rng.randint(0, max_height), height):
+            holes = set(rng.sample(range(width), rng.randint(1, 2)))
+            cells += [(x, y) for x in range(width) if x not in holes]
+        board.place(cells, CELL_CODES["I"])
+        boards.append(board)
+    return boards
+
+
+def recorded_boards(paths: list[str]) -> list[Board]:
+    """Поля из снимков состояния при проигрывании записей replay.py"""
+    boards = []
+    for path in paths:
+        player = ReplayPlayer.load(path)
+        player.play()
+        for _, _, state in player.snapshots:
+            board = Board(BOARD_SIZE)
+            board.restore(state.board)
+            boards.append(board)
+        boards.append(player.engine.board)
+    return boards
+
+
+def line_clear_board(lines: int) -> Board:
+    """Поле с lines заполненными строками внизу и неполными строками над ними"""
+    width, height = BOARD_SIZE
+    board = Board(BOARD_SIZE)
+    cells = [(x, y) for y in range(height - lines, height) for x in range(width)]
+    cells += [(x, y) for y in range(height - lines - 4, height - lines) for x in range(width - 1)]
+    board.place(cells, CELL_CODES["I"])
+    return board
+
+
+def pieces(boards: list[Board]) -> list[Tetromino]:
+    names = list(TETROMINOS)
+    return [Tetromino(names[idx % len(names)], board) for idx, board in enumerate(boards)]
+
+
+# Каждый бенчмарк: (boards, number) -> секунды на number операций.
+# Подготовка, которую нельзя переиспользовать, делается до начала замера.
+
+
+def bench_is_valid_position(boards, number):
+    tetrominos = pieces(boards)
+    start = perf_counter()
+    for idx in range(number):
+        tetrominos[idx % len(tetrominos)].is_valid_position(0, 1)
+    return perf_counter() - start
+
+
+def bench_move(boards, number):
+    tetrominos = pieces(boards)
+    start = perf_counter()
+    for idx in range(number // 2):
+        tetromino = tetrominos[idx % len(tetrominos)]
+        tetromino.move(1, 0)
+        tetromino.move(-1, 0)
+    return perf_counter() - start
+
+
+def bench_rotate(boards, number):
+    tetrominos = pieces(boards)
+    for tetromino in tetrominos:
+        tetromino.y = 2
+    start = perf_counter()
+    for idx in range(number):
+        tetrominos[idx % len(tetrominos)].rotate(1)
+    return perf_counter() - start
+
+
+def bench_hard_drop(boards, number):
+    # Фигура фиксируется на поле, поэтому у каждой операции своя копия поля
+    tetrominos = pieces([copy.deepcopy(boards[idx % len(boards)]) for idx in range(number)])
+    start = perf_counter()
+    for tetromino in tetrominos:
+        tetromino.hard_drop()
+    return perf_counter() - start
+
+
+def bench_check_lines(lines):
+    def bench(boards, number):
+        template = line_clear_board(lines)
+        copies = [copy.deepcopy(template) for _ in range(number)]
+        start = perf_counter()
+        for board in copies:
+            board.check_lines()
+        return perf_counter() - start
+
+    return bench
+
+
+def bench_enumerate_placements(boards, number):
+    # LRU полей очищается перед каждым вызовом (среди полей есть одинаковые),
+    # так что замеряется сам поиск. Кэш положений у старта (_spawn_cache) не
+    # очищается: в игре он тоже срабатывает почти всегда
+    names = list(TETROMINOS)
+    start = perf_counter()
+    for idx in range(number):
+        placements._cache.clear()
+        placements.enumerate_placements(boards[idx // len(names) % len(boards)], names[idx % len(names)])
+    return perf_counter() - start
+
+
+def bench_get_tetromino(boards, number):
+    engine = Engine(seed=0)
+    start = perf_counter()
+    for _ in range(number):
+        engine.get_tetromino()
+    return perf_counter() - start
+
+
+def bench_update_window(full_redraw):
+    def bench(boards, number):
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        from main import Game
+
+        game = Game()
+        game.is_paused = False
+        game.update_window()
+        start = perf_counter()
+        for idx in range(number):
+            if full_redraw:
+                game.renderer.invalidate()
+            elif idx % 2:
+                # Фигура сдвигается туда-обратно, чтобы было что перерисовать
+                game.engine.tetromino.move(1, 0)
+            else:
+                game.engine.tetromino.move(-1, 0)
+            game.update_window()
+        return perf_counter() - start
+
+    return bench
+
+
+BENCHMARKS = {
+    "tetromino.is_valid_position": (bench_is_valid_position, 200_000),
+    "tetromino.move": (bench_move, 100_000),
+    "tetromino.rotate": (bench_rotate, 100_000),
+    "tetromino.hard_drop": (bench_hard_drop, 5_000),
+    **{
+        f"board.check_lines[{lines}]": (bench_check_lines(lines), 5_000)
+        for lines in range(5)
+    },
+    "placements.enumerate_placements": (bench_enumerate_placements, 2_000),
+    "engine.get_tetromino": (bench_get_tetromino, 20_000),
+    "game.update_window[incremental]": (bench_update_window(False), 500),
+    "game.update_window[full]": (bench_update_window(True), 200),
+}
+
+
+def run(names, boards, repeat: int, scale: float) -> dict:
+    """Лучшее время из repeat прогонов, в наносекундах на операцию"""
+    results = {}
+    for name in names:
+        bench, number = BENCHMARKS[name]
+        number = max(1, int(number * scale))
+        best = min(bench(boards, number) for _ in range(repeat))
+        results[name] = {"ns_per_op": best / number * 1e9, "ops": number}
+        print(f"{name:<34}{best / number * 1e9:12.0f} ns/op", file=sys.stderr)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """Печатает изменения к baseline, возвращает False при замедлении больше threshold"""
+    ok = True
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["ns_per_op"] / baseline[name]["ns_per_op"]
+        regressed = ratio > 1 + threshold
+        ok = ok and not regressed
+        print(
+            f"{name:<34}{baseline[name]['ns_per_op']:12.0f}{result['ns_per_op']:12.0f}"
+            f"{ratio:8.2f}x{'  REGRESSION' if regressed else ''}"
+        )
+    return ok
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark engine, line clear and render hot paths")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all)")
+    parser.add_argument("--list", action="store_true", help="list benchmark names and exit")
+    parser.add_argument("--replay", action="append", default=[], help="take boards from this replay")
+    parser.add_argument("--boards", type=int, default=256, help="number of synthetic boards")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply operation counts")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown, 0.1 = 10%%")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        sys.exit(f"Unknown benchmarks: {', '.join(unknown)}")
+
+    boards = recorded_boards(args.replay) if args.replay else synthetic_boards(args.boards, args.seed)
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "boards": "recorded" if args.replay else "synthetic",
+        "results": run(args.names or list(BENCHMARKS), boards, args.repeat, args.scale),
+    }
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    elif not args.compare:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if not compare(results["results"], baseline["results"], args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
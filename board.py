@@ -1,94 +1,205 @@
-import pygame
+from typing import NamedTuple
 
-from math import sin
+from shapes import EMPTY_CODE
 
-from config import (
-    BOARD_BLOCK_COLOR,
-    BOARD_LINE_COLOR,
-    BOARD_LINE_THICKNESS,
-)
+
+class BoardState(NamedTuple):
+    """Неизменяемый снимок поля из Board.snapshot()"""
+
+    rows: tuple[int, ...]
+    cells: bytes
+    heights: tuple[int, ...]
 
 
 class Board:
-    def __init__(self, x: float, y: float, block_size: float, board_size: tuple[int, int]):
-        self.x = x
-        self.y = y
+    def __init__(self, board_size: tuple[int, int]):
         self.width, self.height = board_size
-        self.block_size = block_size
-        self.grid = [[0 for _ in range(self.width)] for _ in range(self.height)]
-        self.colors = [[BOARD_BLOCK_COLOR for _ in range(self.width)] for _ in range(self.height)]
-
-    def check_lines(self):    
-        lines_cleared = 0
-        new_grid = []
-        new_colors = []
-        
-        for row, color_row in zip(self.grid, self.colors):
-            if not all(row):
-                new_grid.append(row)
-                new_colors.append(color_row)
-            else:
-                lines_cleared += 1
-
-        for _ in range(lines_cleared):
-            new_grid.insert(0, [0 for _ in range(self.width)])
-            new_colors.insert(0, [BOARD_BLOCK_COLOR for _ in range(self.width)])
-
-        self.grid = new_grid
-        self.colors = new_colors
-        
-        return lines_cleared
-
-    def draw(self, surface: pygame.Surface):
-        self.draw_blocks(surface)
-        self.draw_lines(surface)
-
-    def draw_lines(self, surface: pygame.Surface):
-        # Vertical lines
-        for x in range(self.width + 1):
-            pygame.draw.line(
-                surface,
-                BOARD_LINE_COLOR,
-                (self.x + x * self.block_size, self.y),
-                (self.x + x * self.block_size, self.y + self.height * self.block_size),
-                width=BOARD_LINE_THICKNESS,
-            )
-        # Horizontal lines
-        for y in range(self.height + 1):
-            pygame.draw.line(
-                surface,
-                BOARD_LINE_COLOR,
-                (self.x, self.y + y * self.block_size),
-                (self.x + self.width * self.block_size, self.y + y * self.block_size),
-                width=BOARD_LINE_THICKNESS,
-            )        
-
-    def draw_blocks(self, surface):
-        for y in range(self.height):
-            for x in range(self.width):
-                pygame.draw.rect(
-                    surface,
-                    self.colors[y][x],
-                    (
-                        self.x + x * self.block_size + BOARD_LINE_THICKNESS,
-                        self.y + y * self.block_size + BOARD_LINE_THICKNESS,
-                        self.block_size - BOARD_LINE_THICKNESS,
-                        self.block_size - BOARD_LINE_THICKNESS,
-                    ),
-                )
-
-    def draw_gradient(self):
-        current_time = pygame.time.get_ticks() / 1000
-
-        for row in range(self.height):
-            for column in range(self.width):
-                r = int((sin((row + current_time * 1.5) * 0.5) + 1) * 128)
-                g = int((sin((column + current_time * 1.5) * 0.5) + 1) * 128)
-                b = int((sin((row + column + current_time * 1.5) * 0.5) + 1) * 128)
-                color = (r, g, b, 255)
-
-                self.colors[row][column] = color
+        # Bitboard: one int per row, bit x is set when column x is occupied
+        self.full_row_mask = (1 << self.width) - 1
+        self.rows = [0] * self.height
+        # Коды клеток из shapes.CELL_CODES построчно, 0 - пусто. Цвет по коду
+        # берётся только при отрисовке, rows остаётся индексом занятости
+        self._empty_row = bytes((EMPTY_CODE,)) * self.width
+        self.cells = bytearray(self._empty_row * self.height)
+        # Высота стопки в каждом столбце (0 - столбец пуст)
+        self.heights = [0] * self.width
+        # Увеличивается при каждом изменении поля, по нему сбрасываются кэши фигур
+        self.version = 0
+        # Строки, изменившиеся с последней отрисовки: бит y - строка y
+        self.dirty_rows = 0
+        # Наблюдатели с методами on_place(cells), on_lines_cleared(rows), on_reset()
+        self.listeners = []
+
+    def is_occupied(self, x: int, y: int) -> bool:
+        return bool(self.rows[y] >> x & 1)
+
+    def fits(self, shape, x: int, y: int) -> bool:
+        """Проверяет, помещается ли поворот фигуры из SHAPE_TABLE в (x, y)"""
+        if x + shape.min_col < 0 or x + shape.max_col >= self.width:
+            return False
+        return not self.collides(shape.row_masks, x, y)
+
+    def collides(self, row_masks, x: int, y: int) -> bool:
+        """Проверяет пересечение фигуры (маски строк) с блоками на поле.
+
+        Границы по горизонтали проверяются вызывающим кодом, клетки выше поля
+        (y < 0) считаются свободными.
+        """
+        rows = self.rows
+        for row_offset, mask in row_masks:
+            row_y = y + row_offset
+            if row_y >= self.height:
+                return True
+            if row_y >= 0 and rows[row_y] & (mask << x if x >= 0 else mask >> -x):
+                return True
+        return False
+
+    def drop_distance(self, shape, x: int, y: int) -> int:
+        """Возвращает, на сколько клеток фигура может опуститься из (x, y)"""
+        distance = self.height
+        for col, row in shape.column_bottoms:
+            top = self.height - self.heights[x + col]
+            if y + row >= top:
+                break  # Фигура под навесом - считаем по шагам
+            distance = min(distance, top - 1 - y - row)
+        else:
+            return distance
+
+        distance = 0
+        while not self.collides(shape.row_masks, x, y + distance + 1):
+            distance += 1
+        return distance
+
+    def place(self, cells, code: int):
+        rows = self.rows
+        heights = self.heights
+        board_cells = self.cells
+        width = self.width
+        dirty_rows = self.dirty_rows
+        for x, y in cells:
+            rows[y] |= 1 << x
+            board_cells[y * width + x] = code
+            heights[x] = max(heights[x], self.height - y)
+            dirty_rows |= 1 << y
+        self.dirty_rows = dirty_rows
+        self.version += 1
+        for listener in self.listeners:
+            listener.on_place(cells)
+
+    def _update_heights(self):
+        heights = [0] * self.width
+        remaining = self.full_row_mask
+        for y, row in enumerate(self.rows):
+            top_cells = row & remaining
+            while top_cells:
+                lowest_bit = top_cells & -top_cells
+                heights[lowest_bit.bit_length() - 1] = self.height - y
+                top_cells ^= lowest_bit
+            remaining &= ~row
+            if not remaining:
+                break
+        self.heights = heights
+
+    def check_lines(self, rows=None) -> int:
+        """Очищает заполненные строки и возвращает их число.
+
+        rows - строки, которые нужно проверить (обычно строки только что
+        зафиксированной фигуры), по умолчанию проверяются все. Строки выше
+        сдвигаются вниз на месте.
+        """
+        full_row_mask = self.full_row_mask
+        board_rows = self.rows
+        if rows is None:
+            if full_row_mask not in board_rows:
+                return 0
+            rows = range(self.height)
+        cleared_rows = sorted(y for y in rows if board_rows[y] == full_row_mask)
+        if not cleared_rows:
+            return 0
+
+        # Выше верхнего блока строки пустые - их не трогаем. Оставшиеся строки
+        # сдвигаются вниз одной записью в срез, сверху добавляются пустые
+        stack_top = self.height - max(self.heights)
+        bottom = cleared_rows[-1]
+        cleared = set(cleared_rows)
+        kept = [y for y in range(stack_top, bottom + 1) if y not in cleared]
+        width = self.width
+        board_rows[stack_top:bottom + 1] = [0] * len(cleared_rows) + [board_rows[y] for y in kept]
+        cells = self.cells
+        cells[stack_top * width:(bottom + 1) * width] = self._empty_row * len(cleared_rows) + b"".join(
+            cells[y * width:(y + 1) * width] for y in kept
+        )
+
+        self._update_heights()
+        self._mark_rows_dirty(bottom + 1, stack_top)
+        self.version += 1
+        for listener in self.listeners:
+            listener.on_lines_cleared(cleared_rows)
+
+        return len(cleared_rows)
+
+    def scroll_up(self, count: int):
+        """Сдвигает содержимое на count строк вверх, снизу появляются пустые строки"""
+        self.rows[:] = self.rows[count:] + [0] * count
+        del self.cells[:count * self.width]
+        self.cells.extend(self._empty_row * count)
+        self._update_heights()
+        self._mark_rows_dirty()
+        self.version += 1
+        for listener in self.listeners:
+            listener.on_reset()
+
+    def add_garbage(self, lines: int, hole: int, code: int) -> bool:
+        """Поднимает поле на lines строк и добавляет снизу строки мусора с дырой в столбце hole.
+
+        Возвращает True, если блоки вытолкнуты за верх поля.
+        """
+        topped_out = any(self.rows[:lines])
+        garbage_row = self.full_row_mask & ~(1 << hole)
+        garbage_cells = bytes(EMPTY_CODE if x == hole else code for x in range(self.width))
+        self.rows[:] = self.rows[lines:] + [garbage_row] * lines
+        del self.cells[:lines * self.width]
+        self.cells.extend(garbage_cells * lines)
+        self._update_heights()
+        self._mark_rows_dirty()
+        self.version += 1
+        for listener in self.listeners:
+            listener.on_reset()
+        return topped_out
+
+    def _mark_rows_dirty(self, end: int | None = None, start: int = 0):
+        end = end if end is not None else self.height
+        self.dirty_rows |= ((1 << (end - start)) - 1) << start
+
+    def take_dirty_rows(self) -> int:
+        """Возвращает маску строк, изменившихся с прошлого вызова, и сбрасывает её"""
+        dirty_rows = self.dirty_rows
+        self.dirty_rows = 0
+        return dirty_rows
 
     def reset(self):
-        self.grid = [[0 for _ in range(self.width)] for _ in range(self.height)]
-        self.colors = [[BOARD_BLOCK_COLOR for _ in range(self.width)] for _ in range(self.height)]
+        self.rows = [0] * self.height
+        self.heights = [0] * self.width
+        self._mark_rows_dirty()
+        self.version += 1
+        self.cells = bytearray(self._empty_row * self.height)
+        for listener in self.listeners:
+            listener.on_reset()
+
+    def snapshot(self) -> BoardState:
+        """Снимок поля: строки и высоты плюс одна копия буфера кодов клеток"""
+        return BoardState(tuple(self.rows), bytes(self.cells), tuple(self.heights))
+
+    def restore(self, state: BoardState):
+        width = self.width
+        cells = self.cells
+        if cells != state.cells:
+            for y in range(self.height):
+                if cells[y * width:(y + 1) * width] != state.cells[y * width:(y + 1) * width]:
+                    self.dirty_rows |= 1 << y
+        self.rows = list(state.rows)
+        self.cells[:] = state.cells
+        self.heights = list(state.heights)
+        self.version += 1
+        for listener in self.listeners:
+            listener.on_reset()
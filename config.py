@@ -1,6 +1,9 @@
 WIDTH = 800
 HEIGHT = 600
-FPS = 60
+FPS = 60  # Частота отрисовки
+IDLE_FPS = 15  # Частота отрисовки на паузе
+LOGIC_RATE = 60  # Логических шагов в секунду, не зависит от FPS
+MAX_CATCH_UP_STEPS = 5  # Сколько шагов логики можно догнать за один кадр
 FONT_NAME = "consolas"
 FONT_SIZE = WIDTH // 30
 
@@ -8,10 +11,14 @@ FONT_SIZE = WIDTH // 30
 BOARD_SIZE = (10, 20)     
 HOLD_BOARD_SIZE = (4, 4)
 NUM_NEXT_BLOCKS = 3
-NEXT_BOARD_SIZE = (4, 4 * NUM_NEXT_BLOCKS)
+NEXT_SLOT_HEIGHT = 4  # Высота ячейки одной фигуры в окне NEXT
+RANDOMIZER = "7-bag"  # 7-bag, 14-bag или nes
+NEXT_BOARD_SIZE = (4, NEXT_SLOT_HEIGHT * NUM_NEXT_BLOCKS)
 
 BOARD_LINE_THICKNESS = 1
 
+TEXT_CACHE_SIZE = 256  # Отрендеренных текстов в LRU кэше TextCache
+
 STATS_BOX_PADDING = 15
 
 HORIZONTAL_MARGIN_RATIO = 3
@@ -24,6 +31,26 @@ ARR_DELAY = 0.05        # Скорость ARR (0.05 сек)
 LOCK_DELAY = 0.25        # seconds before piece locks in place after touching down
 MAX_LOCK_RESETS = 10    # maximum number of lock delay resets per piece
 
+# Запись ввода в бинарные повторы (replay.py)
+RECORD_REPLAYS = False
+REPLAYS_DIR = "replays"
+REPLAY_SNAPSHOT_INTERVAL = LOGIC_RATE * 10  # кадров между снимками состояния для перемотки
+
+# Замеры времени кадра (profiler.py) с оверлеем p50/p95/p99 в углу окна
+PROFILE = False
+PROFILE_WINDOW = 600  # замеров на секцию в скользящем окне
+PROFILE_OVERLAY_REFRESH = 30  # кадров между обновлениями оверлея
+PROFILE_TRACE_PATH = None  # .csv или .json, сохраняется при выходе
+
+# Сервер режима versus (server.py): комнаты делятся между процессами,
+# процесс i слушает порт SERVER_PORT + i и принимает комнаты с номером % SERVER_WORKERS == i
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 7650
+SERVER_WORKERS = 4
+SERVER_STATE_INTERVAL = LOGIC_RATE // 10  # шагов логики между рассылками состояния
+SERVER_MAX_BUFFERED = 64 * 1024  # байт в очереди на отправку, после которых клиент отключается
+SERVER_MAX_INPUTS_PER_TICK = 16  # действий клиента за шаг логики, остальные отбрасываются
+
 BACKGROUND_COLOR = (0, 0, 0)
 
 HEADERS_COLOR = (255, 255, 255)
@@ -40,6 +67,8 @@ TETROMINOS_COLORS = {
 }
 
 BOARD_BLOCK_COLOR = (0, 0, 0)
+GHOST_BLOCK_COLOR = (128, 128, 128)
+GARBAGE_BLOCK_COLOR = (90, 90, 90)
 BOARD_LINE_COLOR = (255, 255, 255)
 
 # Очки за очистку линий (базовые значения)
@@ -48,9 +77,22 @@ BOARD_LINE_COLOR = (255, 255, 255)
 # 3 линии: 300 * (level + 1)
 # 4 линии (Tetris): 1200 * (level + 1)
 SCORE_DATA = {1: 40, 2: 100, 3: 300, 4: 1200}
+# Строк мусора сопернику за очищенные линии в режиме versus
+GARBAGE_LINES = {1: 0, 2: 1, 3: 2, 4: 4}
+
+# Веса признаков поля для оценки положения фигуры ботом (evaluation.py)
+EVALUATION_WEIGHTS = {
+    "lines_cleared": 0.76,
+    "aggregate_height": -0.51,
+    "holes": -0.36,
+    "bumpiness": -0.18,
+    "row_transitions": -0.32,
+    "well_sums": -0.34,
+}
 
 # Скорость падения (в секундах на клетку) для уровней 0-29
-# Основано на NES NTSC версии (60 FPS)
+# Основано на NES NTSC версии (60 FPS). Если задержка меньше шага логики,
+# фигура падает на несколько клеток за шаг; 0 - мгновенное падение (20G)
 LEVEL_SPEEDS = {
     0: 0.8,   # 48 frames
     1: 0.72,  # 43 frames
@@ -72,6 +114,15 @@ LEVEL_SPEEDS = {
     17: 0.05,
     18: 0.05,
     19: 0.03, # 2 frames (очень быстро)
+    20: 0.03,
+    21: 0.03,
+    22: 0.03,
+    23: 0.03,
+    24: 0.03,
+    25: 0.03,
+    26: 0.03,
+    27: 0.03,
+    28: 0.03,
     29: 0.016 # 1 frame (нереально)
 }
 MAX_LEVEL = max(LEVEL_SPEEDS.keys())
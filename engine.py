@@ -0,0 +1,439 @@
+from collections import defaultdict
+from typing import NamedTuple
+
+from tetromino import Tetromino, TetrominoPool
+from board import Board, BoardState
+from randomizer import Randomizer
+from shapes import SHAPE_TABLE, CELL_CODES, GARBAGE_CODE, spawn_x
+
+from config import (
+    BOARD_SIZE,
+    HOLD_BOARD_SIZE,
+    NUM_NEXT_BLOCKS,
+    NEXT_SLOT_HEIGHT,
+    NEXT_BOARD_SIZE,
+    SCORE_DATA,
+    SOFT_DROP_DELAY,
+    DAS_DELAY,
+    ARR_DELAY,
+    LEVEL_SPEEDS,
+    LOCK_DELAY,
+)
+
+
+# Время ввода внутри шага логики задаётся долей шага от 0 до SUBFRAME_STEPS - 1
+SUBFRAME_STEPS = 255
+
+
+def _unmeasured(name: str, func, *args):
+    return func(*args)
+
+
+def fill_level_speeds(level_speeds: dict[int, float]) -> dict[int, float]:
+    """Дополняет таблицу скоростей до всех уровней от 0 до максимального.
+
+    Пропущенный уровень берёт скорость ближайшего меньшего, уровни ниже
+    первого в таблице - скорость первого.
+    """
+    speed = level_speeds[min(level_speeds)]
+    filled = {}
+    for level in range(max(level_speeds) + 1):
+        speed = level_speeds.get(level, speed)
+        filled[level] = speed
+    return filled
+
+
+# Простые поля Engine, которые сохраняются в снимке как есть
+STATE_FIELDS = (
+    "hold_swapped",
+    "soft_drop",
+    "last_move_time",
+    "move_held_time",
+    "held_direction",
+    "input_time",
+    "piece_count",
+    "game_over",
+    "total_lines_cleared",
+    "score",
+    "level",
+    "frame",
+)
+
+
+class EngineState(NamedTuple):
+    """Неизменяемый снимок Engine.snapshot(); поля движка не разделяет"""
+
+    board: BoardState
+    hold_board: BoardState
+    next_board: BoardState
+    tetromino: tuple
+    hold: tuple | None
+    randomizer: tuple
+    clock_time: float | None  # только для StepClock
+    fields: tuple  # значения STATE_FIELDS
+
+
+class StepClock:
+    """Игровые часы, которые идут только при вызове advance().
+
+    Используются по умолчанию, чтобы симуляция не зависела от реального
+    времени и могла идти быстрее него.
+    """
+
+    def __init__(self, start: float = 0.0):
+        self.time = start
+
+    def __call__(self) -> float:
+        return self.time
+
+    def advance(self, dt: float):
+        self.time += dt
+
+
+class EventBus:
+    """Рассылает события движка подписчикам: publish(event, *args) вызывает handler(*args)"""
+
+    def __init__(self):
+        self._handlers = defaultdict(list)
+
+    def subscribe(self, event: str, handler):
+        self._handlers[event].append(handler)
+
+    def unsubscribe(self, event: str, handler):
+        self._handlers[event].remove(handler)
+
+    def publish(self, event: str, *args):
+        for handler in self._handlers.get(event, ()):
+            handler(*args)
+
+
+class Engine:
+    """Игровая логика без отрисовки и без pygame.
+
+    Время берётся из clock - любой функции, возвращающей секунды. Один вызов
+    step() - один логический кадр; advance(dt) сдвигает StepClock и делает кадр.
+    Скорости уровней и задержки по умолчанию берутся из config.
+
+    Очки, уровень и внешние наблюдатели (отрисовка, запись повторов, звук)
+    работают через events, а не опрашивают состояние каждый кадр. События:
+    input(frame, action, offset), soft_drop(cells), lock(tetromino), lines_cleared(lines),
+    score(score), level(level), game_over(). Фигура из lock после обработки
+    события возвращается в пул и переиспользуется, хранить её нельзя.
+    """
+
+    # Действия ввода для apply_input
+    INPUT_ACTIONS = (
+        "left_press",
+        "left_release",
+        "right_press",
+        "right_release",
+        "soft_drop_press",
+        "soft_drop_release",
+        "hard_drop",
+        "rotate_cw",
+        "rotate_ccw",
+        "hold",
+        "release_all",
+    )
+
+    def __init__(
+        self,
+        seed: int | None = None,
+        clock=None,
+        randomizer: Randomizer | None = None,
+        level_speeds: dict[int, float] = LEVEL_SPEEDS,
+        lock_delay: float = LOCK_DELAY,
+        das_delay: float = DAS_DELAY,
+        arr_delay: float = ARR_DELAY,
+    ):
+        self.clock = clock if clock is not None else StepClock()
+        self.randomizer = randomizer if randomizer is not None else Randomizer(seed)
+        self.level_speeds = level_speeds = fill_level_speeds(level_speeds)
+        self.max_level = max(level_speeds.keys())
+        self.lock_delay = lock_delay
+        self.das_delay = das_delay
+        self.arr_delay = arr_delay
+
+        self.board = Board(BOARD_SIZE)
+        self.hold_board = Board(HOLD_BOARD_SIZE)
+        self.next_board = Board(NEXT_BOARD_SIZE)
+
+        self.hold = None
+        self.hold_swapped = False
+
+        self.soft_drop = False
+        self.last_move_time = 0
+        self.move_held_time = 0
+        self.held_direction = 0
+        # Время текущего действия ввода - точнее шага, если ввод пришёл с меткой времени
+        self.input_time = 0
+
+        self.pool = TetrominoPool(self.clock, level_speeds, lock_delay)
+        # Растёт при каждой смене активной фигуры (появление или обмен с hold)
+        self.piece_count = 0
+
+        self.game_over = False
+        self.total_lines_cleared = 0
+        self.score = 0
+        self.level = 0
+        self.frame = 0
+        self.events = EventBus()
+        self.events.subscribe("lock", self.clear_lines)
+        self.events.subscribe("soft_drop", self.score_soft_drop)
+        self.events.subscribe("lines_cleared", self.score_lines)
+        self.events.subscribe("lines_cleared", self.check_level_up)
+        # Объект с методом measure(name, func, *args), например profiler.FrameProfiler
+        self.profiler = None
+
+        for idx, shape_name in enumerate(self.randomizer.preview(NUM_NEXT_BLOCKS)):
+            self._show_next(idx, shape_name)
+        self.tetromino = self.get_tetromino()
+
+    def step(self, inputs=(), start: float | None = None):
+        """Один логический кадр.
+
+        inputs - [(offset, action)] ввода, пришедшего за этот шаг, по порядку:
+        offset - доля шага в SUBFRAME_STEPS-х от start до текущего времени clock.
+        Задержки DAS/ARR отсчитываются от этого времени, а не от начала шага.
+        """
+        if self.game_over:
+            return
+        self.frame += 1
+        measure = self.profiler.measure if self.profiler is not None else _unmeasured
+
+        if inputs:
+            end = self.clock()
+            start = end if start is None else start
+            for offset, action in inputs:
+                self.apply_input(action, offset, start + (end - start) * offset / SUBFRAME_STEPS)
+                if self.game_over:
+                    return
+
+        tetromino = self.tetromino
+        y = tetromino.y
+        block_locked, lock_above = measure("fall", tetromino.fall)
+        if block_locked:
+            measure("lock", self.events.publish, "lock", tetromino)
+            self.pool.release(tetromino)
+            self.tetromino = self.get_tetromino()
+        elif self.soft_drop and tetromino.y != y:
+            self.events.publish("soft_drop", tetromino.y - y)
+        if lock_above:
+            self.end_game()
+            return
+
+        self._handle_das_arr()
+
+    def advance(self, dt: float, inputs=()):
+        start = self.clock()
+        self.clock.advance(dt)
+        self.step(inputs, start)
+
+    # Снимки состояния
+
+    def snapshot(self) -> EngineState:
+        """Снимок всего игрового состояния.
+
+        Поле снимается копией строк bitboard, высот и буфера кодов клеток
+        (bytearray на ширину x высоту байт), без глубокого копирования.
+        """
+        return EngineState(
+            board=self.board.snapshot(),
+            hold_board=self.hold_board.snapshot(),
+            next_board=self.next_board.snapshot(),
+            tetromino=self.tetromino.snapshot(),
+            hold=self.hold.snapshot() if self.hold is not None else None,
+            randomizer=self.randomizer.snapshot(),
+            clock_time=self.clock.time if isinstance(self.clock, StepClock) else None,
+            fields=tuple(getattr(self, name) for name in STATE_FIELDS),
+        )
+
+    def restore(self, state: EngineState):
+        """Возвращает движок в состояние из snapshot(); подписчики событий не меняются"""
+        self.board.restore(state.board)
+        self.hold_board.restore(state.hold_board)
+        self.next_board.restore(state.next_board)
+        self.randomizer.restore(state.randomizer)
+        if state.clock_time is not None:
+            self.clock.time = state.clock_time
+        for name, value in zip(STATE_FIELDS, state.fields):
+            setattr(self, name, value)
+
+        self.tetromino.restore(state.tetromino, self.board)
+        if state.hold is None:
+            if self.hold is not None:
+                self.pool.release(self.hold)
+            self.hold = None
+        else:
+            if self.hold is None:
+                self.hold = self.pool.acquire(state.hold[0], self.hold_board)
+            self.hold.restore(state.hold, self.hold_board)
+
+    # Ввод
+
+    def apply_input(self, action: str, offset: int | None = None, time: float | None = None):
+        """Применяет действие ввода сразу.
+
+        Без offset действие считается случившимся между шагами, в текущее время
+        clock; step передаёт offset и точное время действия внутри шага.
+        """
+        self.input_time = time if time is not None else self.clock()
+        self.events.publish("input", self.frame, action, offset)
+
+        if action == "left_press":
+            self.move_pressed(-1)
+        elif action == "left_release":
+            self.move_released(-1)
+        elif action == "right_press":
+            self.move_pressed(1)
+        elif action == "right_release":
+            self.move_released(1)
+        elif action == "soft_drop_press":
+            self.soft_drop_pressed()
+        elif action == "soft_drop_release":
+            self.soft_drop_released()
+        elif action == "hard_drop":
+            self.hard_drop()
+        elif action == "rotate_cw":
+            self.rotate(1)
+        elif action == "rotate_ccw":
+            self.rotate(-1)
+        elif action == "hold":
+            self.hold_pressed()
+        elif action == "release_all":
+            self.release_inputs()
+        else:
+            raise ValueError(f"Unknown input action: {action}")
+
+    def move_pressed(self, direction: int):
+        self.held_direction = direction
+        self.move_held_time = self.input_time
+        self.tetromino.move(direction, 0)
+        self.last_move_time = self.move_held_time
+
+    def move_released(self, direction: int):
+        if self.held_direction == direction:
+            self.held_direction = 0
+
+    def soft_drop_pressed(self):
+        if not self.soft_drop:
+            self.soft_drop = True
+            self.tetromino.set_fall_delay(self.soft_drop_delay())
+
+    def soft_drop_delay(self) -> float:
+        """Мягкое падение не медленнее обычного: на быстрых уровнях и в 20G падает как уровень"""
+        return min(SOFT_DROP_DELAY, self.level_speeds[self.level])
+
+    def soft_drop_released(self):
+        self.soft_drop = False
+        self.tetromino.reset_fall_delay()
+
+    def hard_drop(self):
+        tetromino = self.tetromino
+        lock_above = tetromino.hard_drop()
+        self.events.publish("lock", tetromino)
+        self.pool.release(tetromino)
+        self.tetromino = self.get_tetromino()
+        if lock_above:
+            self.end_game()
+
+    def rotate(self, direction: int):
+        self.tetromino.rotate(direction)
+
+    def hold_pressed(self):
+        if not self.hold_swapped:
+            self.swap_hold()
+
+    def release_inputs(self):
+        self.soft_drop = False
+        self.held_direction = 0
+        self.last_move_time = 0
+        self.move_held_time = 0
+        self.tetromino.reset_fall_delay()
+
+    # Логика
+
+    def new_tetromino(self, shape_name: str) -> Tetromino:
+        return self.pool.acquire(shape_name, self.board, self.level)
+
+    def _show_next(self, idx: int, shape_name: str):
+        shape = SHAPE_TABLE[shape_name][0]
+        x = spawn_x(shape_name, self.next_board.width)
+        y = idx * NEXT_SLOT_HEIGHT + 1
+        self.next_board.place([(x + col, y + row) for col, row in shape.cells], CELL_CODES[shape_name])
+
+    def get_tetromino(self):
+        tetromino_name = self.randomizer.next()
+
+        # Превью сдвигается на одну фигуру, дорисовывается только последняя
+        self.next_board.scroll_up(NEXT_SLOT_HEIGHT)
+        self._show_next(NUM_NEXT_BLOCKS - 1, self.randomizer.preview(NUM_NEXT_BLOCKS)[-1])
+
+        self.hold_swapped = False
+        self.piece_count += 1
+        tetromino = self.new_tetromino(tetromino_name)
+        if self.soft_drop:
+            # Мягкое падение продолжается для новой фигуры, пока клавиша зажата
+            tetromino.set_fall_delay(self.soft_drop_delay())
+        return tetromino
+
+    def end_game(self):
+        self.game_over = True
+        self.events.publish("game_over")
+
+    def check_level_up(self, lines: int):
+        level = min(self.total_lines_cleared // 10, self.max_level)
+        if level != self.level:
+            self.level = level
+            self.events.publish("level", level)
+
+    def score_soft_drop(self, cells: int):
+        self.score += cells  # 1 point per soft drop cell
+        self.events.publish("score", self.score)
+
+    def score_lines(self, lines: int):
+        self.total_lines_cleared += lines
+        self.score += SCORE_DATA[lines] * (self.level + 1)
+        self.events.publish("score", self.score)
+
+    def clear_lines(self, tetromino: Tetromino):
+        """Очищает строки после фиксации фигуры, проверяя только её строки"""
+        lines = self.board.check_lines({y for _, y in tetromino.get_cells() if y >= 0})
+        if lines > 0:
+            self.events.publish("lines_cleared", lines)
+
+    def receive_garbage(self, lines: int, hole: int):
+        """Добавляет снизу строки мусора от соперника; вытеснение за верх - конец игры"""
+        if self.board.add_garbage(lines, hole, GARBAGE_CODE) or not self.tetromino.lift(lines):
+            self.end_game()
+
+    def swap_hold(self):
+        if self.hold is None:
+            self.hold = self.tetromino
+            self.hold.swap_board(self.hold_board, y=1, lock=True)
+
+            self.tetromino = self.get_tetromino()
+        else:
+            self.hold, self.tetromino = self.tetromino, self.hold
+            self.piece_count += 1
+
+            self.hold.swap_board(self.hold_board, y=1, board_reset=True, lock=True)
+
+            self.tetromino.swap_board(self.board)
+        self.hold_swapped = True
+
+    def _handle_das_arr(self):
+        if self.held_direction == 0:
+            return
+
+        # Автоповтор идёт по расписанию от момента нажатия: первый сдвиг через
+        # das_delay, затем каждые arr_delay; за один шаг их может быть несколько
+        current_time = self.clock()
+        next_move = max(self.move_held_time + self.das_delay, self.last_move_time + self.arr_delay)
+        while next_move <= current_time:
+            if not self.tetromino.move(self.held_direction, 0):
+                # Упёрлись - пропущенные повторы не копятся
+                self.last_move_time = current_time
+                break
+            self.last_move_time = next_move
+            next_move += self.arr_delay
@@ -0,0 +1,154 @@
+from shapes import SHAPE_TABLE
+
+from config import EVALUATION_WEIGHTS
+
+
+def row_transitions(row: int, width: int) -> int:
+    """Число переходов занято/пусто в строке, стены считаются занятыми"""
+    bits = row << 1 | 1 | 1 << (width + 1)
+    return ((bits ^ (bits >> 1)) & ((1 << (width + 1)) - 1)).bit_count()
+
+
+def bumpiness(heights) -> int:
+    return sum(abs(left - right) for left, right in zip(heights, heights[1:]))
+
+
+def well_sums(heights, board_height: int) -> int:
+    """Сумма 1 + 2 + ... + d по всем колодцам глубины d"""
+    total = 0
+    last = len(heights) - 1
+    for x, height in enumerate(heights):
+        left = heights[x - 1] if x > 0 else board_height
+        right = heights[x + 1] if x < last else board_height
+        depth = min(left, right) - height
+        if depth > 0:
+            total += depth * (depth + 1) // 2
+    return total
+
+
+def column_stats(rows, width: int, height: int) -> tuple[list[int], list[int]]:
+    """Возвращает высоты столбцов и число занятых клеток в каждом столбце"""
+    heights = [0] * width
+    filled = [0] * width
+    for y, row in enumerate(rows):
+        while row:
+            lowest_bit = row & -row
+            x = lowest_bit.bit_length() - 1
+            filled[x] += 1
+            if not heights[x]:
+                heights[x] = height - y
+            row ^= lowest_bit
+    return heights, filled
+
+
+class BoardFeatures:
+    """Признаки поля для оценки положений фигур ботом.
+
+    Подписывается на изменения Board и обновляет признаки по изменившимся
+    клеткам и строкам, а не пересчитывает всё поле. Высоты столбцов берутся
+    из Board.heights, дыры считаются как высота минус число занятых клеток.
+    """
+
+    def __init__(self, board, weights: dict[str, float] = EVALUATION_WEIGHTS):
+        self.board = board
+        self.weights = weights
+        self.on_reset()
+        board.listeners.append(self)
+
+    def detach(self):
+        self.board.listeners.remove(self)
+
+    # Уведомления от Board
+
+    def on_reset(self):
+        board = self.board
+        _, filled = column_stats(board.rows, board.width, board.height)
+        self.filled_cells = sum(filled)
+        self.row_transitions = [row_transitions(row, board.width) for row in board.rows]
+        self.total_row_transitions = sum(self.row_transitions)
+
+    def on_place(self, cells):
+        self.filled_cells += len(cells)
+        rows = self.board.rows
+        width = self.board.width
+        for y in {y for _, y in cells}:
+            transitions = row_transitions(rows[y], width)
+            self.total_row_transitions += transitions - self.row_transitions[y]
+            self.row_transitions[y] = transitions
+
+    def on_lines_cleared(self, cleared_rows):
+        width = self.board.width
+        self.filled_cells -= len(cleared_rows) * width
+        for y in reversed(cleared_rows):
+            self.total_row_transitions -= self.row_transitions.pop(y)
+        empty_transitions = row_transitions(0, width)
+        self.row_transitions[0:0] = [empty_transitions] * len(cleared_rows)
+        self.total_row_transitions += empty_transitions * len(cleared_rows)
+
+    # Признаки и оценка
+
+    def _features(self, heights, filled_cells: int, total_row_transitions: int, lines_cleared: int) -> dict:
+        aggregate_height = sum(heights)
+        return {
+            "lines_cleared": lines_cleared,
+            "aggregate_height": aggregate_height,
+            "holes": aggregate_height - filled_cells,
+            "bumpiness": bumpiness(heights),
+            "row_transitions": total_row_transitions,
+            "well_sums": well_sums(heights, self.board.height),
+        }
+
+    def features(self) -> dict:
+        return self._features(self.board.heights, self.filled_cells, self.total_row_transitions, 0)
+
+    def placement_features(self, shape_name: str, x: int, y: int, rotation: int) -> dict | None:
+        """Признаки поля после фиксации фигуры в (x, y) и очистки линий.
+
+        Поле не меняется. None, если фигура выходит за верх поля.
+        """
+        board = self.board
+        width, height = board.width, board.height
+        shape = SHAPE_TABLE[shape_name][rotation]
+
+        touched = {}
+        for row_offset, mask in shape.row_masks:
+            row_y = y + row_offset
+            if row_y < 0:
+                return None
+            touched[row_y] = board.rows[row_y] | (mask << x if x >= 0 else mask >> -x)
+
+        cleared = [row_y for row_y, row in touched.items() if row == board.full_row_mask]
+        if cleared:
+            # Очистка сдвигает всё поле - считаем признаки заново
+            rows = [0] * len(cleared) + [
+                touched.get(row_y, row)
+                for row_y, row in enumerate(board.rows)
+                if row_y not in cleared
+            ]
+            heights, filled = column_stats(rows, width, height)
+            transitions = sum(row_transitions(row, width) for row in rows)
+            return self._features(heights, sum(filled), transitions, len(cleared))
+
+        heights = list(board.heights)
+        for col, row in shape.cells:
+            heights[x + col] = max(heights[x + col], height - (y + row))
+        transitions = self.total_row_transitions
+        for row_y, row in touched.items():
+            transitions += row_transitions(row, width) - self.row_transitions[row_y]
+        return self._features(heights, self.filled_cells + len(shape.cells), transitions, 0)
+
+    def score(self, features: dict) -> float:
+        weights = self.weights
+        return sum(weights[name] * value for name, value in features.items())
+
+    def evaluate(self) -> float:
+        return self.score(self.features())
+
+    def score_placement(self, placement) -> float:
+        """Оценка положения из placements.enumerate_placements, больше - лучше"""
+        features = self.placement_features(
+            placement.shape_name, placement.x, placement.y, placement.rotation
+        )
+        if features is None:
+            return float("-inf")
+        return self.score(features)
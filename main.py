@@ -1,41 +1,71 @@
-from random import shuffle
-from math import sqrt, floor
+import os
+
+from collections import deque
+from math import sqrt
+from random import randrange
+from time import perf_counter, strftime
 
 import pygame
 import pygame_widgets
 
 from pygame_widgets.button import Button
 
-from tetromino import Tetromino
-from board import Board
+from engine import Engine, SUBFRAME_STEPS
+from renderer import Renderer, LayerCache, PauseGradient, BoardView, ProfilerOverlay, TextCache
+from replay import Recorder
+from profiler import FrameProfiler
 
 
 from config import (
     WIDTH,
     HEIGHT,
     FPS,
+    IDLE_FPS,
+    LOGIC_RATE,
+    MAX_CATCH_UP_STEPS,
     FONT_SIZE,
     FONT_NAME,
     HORIZONTAL_MARGIN_RATIO,
     VERTICAL_MARGIN_RATIO,
     BOARD_SIZE,
     HOLD_BOARD_SIZE,
-    NUM_NEXT_BLOCKS,
     NEXT_BOARD_SIZE,
-    SCORE_DATA,
-    MAX_LEVEL,
-    TETROMINOS,
-    SOFT_DROP_DELAY,
-    DAS_DELAY,
-    ARR_DELAY,
     HEADERS_COLOR,
     STATS_COLOR,
     BOARD_LINE_COLOR,
     STATS_BOX_PADDING,
     BACKGROUND_COLOR,
+    RECORD_REPLAYS,
+    REPLAYS_DIR,
+    PROFILE,
+    PROFILE_OVERLAY_REFRESH,
+    PROFILE_TRACE_PATH,
 )
 
 
+KEYDOWN_ACTIONS = {
+    pygame.K_LEFT: "left_press",
+    pygame.K_a: "left_press",
+    pygame.K_RIGHT: "right_press",
+    pygame.K_d: "right_press",
+    pygame.K_DOWN: "soft_drop_press",
+    pygame.K_s: "soft_drop_press",
+    pygame.K_SPACE: "hard_drop",
+    pygame.K_UP: "rotate_cw",
+    pygame.K_z: "rotate_ccw",
+    pygame.K_c: "hold",
+}
+
+KEYUP_ACTIONS = {
+    pygame.K_LEFT: "left_release",
+    pygame.K_a: "left_release",
+    pygame.K_RIGHT: "right_release",
+    pygame.K_d: "right_release",
+    pygame.K_DOWN: "soft_drop_release",
+    pygame.K_s: "soft_drop_release",
+}
+
+
 # TODO: add animations
 # TODO: add music and sound effects
 # TODO: add pause functionality
@@ -48,8 +78,17 @@ class Game:
     def __init__(self):
         pygame.init()
         self.win = pygame.display.set_mode((WIDTH, HEIGHT))
-        self.clock = pygame.time.Clock()
+        self.renderer = Renderer(self.win)
+        self.layers = LayerCache()
         self.running = True
+        self.frame_start = perf_counter()
+        self.frame_time = 0.0  # Длительность прошлого кадра, сек
+        self.logic_step = 1 / LOGIC_RATE
+        self.logic_lag = 0.0  # Накопленное время, ещё не отданное логике
+        # События, пришедшие во время ожидания кадра: (время прихода, событие)
+        self.timed_events = []
+        # Действия ввода для логики: (время прихода, действие)
+        self.input_queue = deque()
 
         horizontal_margin = WIDTH / HORIZONTAL_MARGIN_RATIO
         vertical_margin = HEIGHT / VERTICAL_MARGIN_RATIO
@@ -63,80 +102,79 @@ class Game:
                 / (BOARD_SIZE[0] * BOARD_SIZE[1])
             )
         )
-        self.board = Board(
-            x=horizontal_margin,
-            y=vertical_margin,
-            block_size=block_size,
-            board_size=BOARD_SIZE,
-        )
-        
-        self.hide_board = Board(
+        seed = randrange(2**32)
+        self.engine = Engine(seed=seed)
+        self.recorder = None
+        if RECORD_REPLAYS:
+            os.makedirs(REPLAYS_DIR, exist_ok=True)
+            replay_file = open(os.path.join(REPLAYS_DIR, f"{strftime('%Y%m%d-%H%M%S')}-{seed}.trpl"), "wb")
+            self.recorder = Recorder(replay_file, seed=seed, tick_rate=LOGIC_RATE)
+            self.engine.events.subscribe("input", self.recorder.record)
+
+        self.board_view = BoardView(
+            self.engine.board,
             x=horizontal_margin,
             y=vertical_margin,
             block_size=block_size,
-            board_size=BOARD_SIZE,
         )
 
-        self.hold_board = Board(
+        self.hold_view = BoardView(
+            self.engine.hold_board,
             x=horizontal_margin / 2 - HOLD_BOARD_SIZE[0] * block_size / 2,
             y=vertical_margin,
             block_size=block_size,
-            board_size=HOLD_BOARD_SIZE,
         )
 
-        self.next_board = Board(
+        self.next_view = BoardView(
+            self.engine.next_board,
             x=WIDTH - horizontal_margin / 2 - NEXT_BOARD_SIZE[0] * block_size / 2,
             y=vertical_margin,
             block_size=block_size,
-            board_size=NEXT_BOARD_SIZE,
         )
 
-        self.tetrominos = []
-        self.tetromino = None
-        self.hold = None
-        self.hold_swapped = False
-
-        self.soft_drop = False
-        self.last_move_time = 0
-        self.move_held_time = 0
-        self.held_direction = 0
-
         self.is_new_game = True
         self.is_paused = True
+        self.was_paused = None  # Состояние паузы на прошлом кадре
         self.pause_surface = pygame.Surface((WIDTH, HEIGHT))
         self.pause_surface.fill((128, 128, 128))
         self.pause_surface.set_alpha(128)
-        self.game_over = False
-        self.total_lines_cleared = 0
-        self.score = 0
-        self.level = 0
+        self.pause_gradient = PauseGradient(self.board_view)
 
         # Texts
         self.font = pygame.font.SysFont(FONT_NAME, FONT_SIZE)
-        self.score_render = self.font.render(f"Score: {self.score}", 0, STATS_COLOR)
-        self.level_render = self.font.render(f"Level: {self.level + 1}", 0, STATS_COLOR)
-        self.lines_render = self.font.render(
-            f"Lines: {self.total_lines_cleared}", 0, STATS_COLOR
-        )
+        self.stats_texts = TextCache(self.font, antialias=False, digit_colors=(STATS_COLOR,))
+        # Статистика перерисовывается только по событиям движка
+        self.stats_dirty = True
+        for event in ("score", "level", "lines_cleared"):
+            self.engine.events.subscribe(event, self.mark_stats_dirty)
+        self.stats_line_height = self.stats_texts.render("0", STATS_COLOR).get_height()
 
         box_width = (
-            self.hold_board.width * self.hold_board.block_size * 2
+            self.hold_view.board.width * self.hold_view.block_size * 2
             + STATS_BOX_PADDING * 2
         )
-        box_height = (
-            self.score_render.get_height()
-            + self.level_render.get_height()
-            + self.lines_render.get_height()
-            + STATS_BOX_PADDING * 4
-        )
+        box_height = self.stats_line_height * 3 + STATS_BOX_PADDING * 4
         self.stats_box = pygame.Rect(
             horizontal_margin / 2 - box_width / 2,
             HEIGHT
-            - (self.hold_board.y + self.hold_board.height * self.hold_board.block_size)
+            - (self.hold_view.y + self.hold_view.board.height * self.hold_view.block_size)
             - box_height,
             box_width,
             box_height,
         )
+        self.profiler = None
+        self.profiler_overlay = None
+        if PROFILE:
+            self.profiler = FrameProfiler()
+            self.engine.profiler = self.profiler
+            self.profiler_overlay = ProfilerOverlay(
+                self.profiler,
+                pygame.font.SysFont(FONT_NAME, FONT_SIZE // 2),
+                anchor=(WIDTH - STATS_BOX_PADDING, HEIGHT - STATS_BOX_PADDING),
+                color=STATS_COLOR,
+                refresh=PROFILE_OVERLAY_REFRESH,
+            )
+
         self.tetris_render = self.font.render("TETRIS", 1, HEADERS_COLOR)
         self.hold_render = self.font.render("HOLD", 1, HEADERS_COLOR)
         self.next_render = self.font.render("NEXT", 1, HEADERS_COLOR)
@@ -181,266 +219,233 @@ class Game:
 
     def run(self):
         while self.running:
-            if not self.tetromino:
-                self.tetromino = self.get_tetromino()
+            if self.profiler is not None:
+                self.profiler.measure("frame", self.run_frame)
+            else:
+                self.run_frame()
+            # На паузе окно почти статично - рисуем реже
+            self.wait_frame(IDLE_FPS if self.is_paused else FPS)
+
+        if self.recorder is not None:
+            self.recorder.close(self.engine.frame)
+        if self.profiler is not None and PROFILE_TRACE_PATH:
+            self.profiler.dump(PROFILE_TRACE_PATH)
+        pygame.quit()
 
+    def wait_frame(self, fps: int):
+        """Ждёт начала следующего кадра, принимая события по мере их прихода.
+
+        pygame не отдаёт время событий SDL, поэтому вместо сна ждём событие
+        с таймаутом и сами запоминаем время его прихода.
+        """
+        deadline = self.frame_start + 1 / fps
+        remaining = deadline - perf_counter()
+        while remaining > 0:
+            event = pygame.event.wait(max(1, int(remaining * 1000)))
+            if event.type != pygame.NOEVENT:
+                self.timed_events.append((perf_counter(), event))
+            remaining = deadline - perf_counter()
+
+        now = perf_counter()
+        self.frame_time = now - self.frame_start
+        self.frame_start = now
+
+    def run_frame(self):
+        if self.profiler is not None:
+            self.profiler.measure("check_events", self.check_events)
+        else:
             self.check_events()
+
+        if self.engine.game_over:
+            self.stop_game()
+        elif not self.is_paused:
+            self.update_logic()
+
+        if self.profiler is not None:
+            self.profiler.measure("update_window", self.update_window)
+        else:
             self.update_window()
-            self.clock.tick(FPS)
-            
-            if self.is_paused:
-                # self.main_menu()
-                continue
 
-            if self.game_over:
-                self.stop_game()
-                continue
-
-            block_locked, lock_above = self.tetromino.fall()
-            if block_locked:
-                self.tetromino = self.get_tetromino()
-            if lock_above:
-                self.game_over = True
-                continue
-
-            self._handle_das_arr()
-            self.calculate_score()
-            self.check_level_up()
-            
-        pygame.quit()
+    def update_logic(self):
+        """Делает столько логических шагов, сколько прошло с прошлого кадра.
 
-    def check_tetromino_keydown_event(self, event: pygame.event.Event):
-        if event.key in (pygame.K_LEFT, pygame.K_a):
-            self.held_direction = -1
-            self.move_held_time = pygame.time.get_ticks() / 1000
-            self.tetromino.move(-1, 0)
-            self.last_move_time = self.move_held_time
-        elif event.key in (pygame.K_RIGHT, pygame.K_d):
-            self.held_direction = 1
-            self.move_held_time = pygame.time.get_ticks() / 1000
-            self.tetromino.move(1, 0)
-            self.last_move_time = self.move_held_time
-
-        elif event.key in (pygame.K_DOWN, pygame.K_s):
-            if not self.soft_drop:
-                self.soft_drop = True
-                self.tetromino.set_fall_delay(SOFT_DROP_DELAY)
-
-        elif event.key == pygame.K_SPACE:
-            lock_above = self.tetromino.hard_drop()
-            if lock_above:
-                self.game_over = True
-            else:
-                self.tetromino = self.get_tetromino()
-
-        elif event.key == pygame.K_UP:
-            self.tetromino.rotate(1)
-        elif event.key == pygame.K_z:
-            self.tetromino.rotate(-1)
-
-        elif event.key == pygame.K_c:
-            if not self.hold_swapped:
-                self.swap_hold()
-
-    def check_tetromino_keyup_event(self, event: pygame.event.Event):
-        if event.key in (pygame.K_DOWN, pygame.K_s):
-                self.soft_drop = False
-                self.tetromino.reset_fall_delay()
-        elif (
-            event.key in (pygame.K_LEFT, pygame.K_a)
-            and self.held_direction == -1
-        ):
-            self.held_direction = 0
-        elif (
-            event.key in (pygame.K_RIGHT, pygame.K_d)
-            and self.held_direction == 1
-        ):
-            self.held_direction = 0
+        Шаг логики всегда 1 / LOGIC_RATE, поэтому гравитация не зависит от
+        частоты отрисовки. После медленного кадра логика догоняет, но не больше
+        MAX_CATCH_UP_STEPS шагов, остаток отбрасывается.
+        """
+        if self.was_paused:
+            # Время, проведённое на паузе, не догоняем
+            self.logic_lag = 0.0
+        else:
+            self.logic_lag += self.frame_time
+
+        # Реальное время, с которого начинается следующий шаг логики. Ввод
+        # попадает в шаг, на который пришёлся, с точностью до доли шага.
+        step_start = self.frame_start - self.logic_lag
+        steps = 0
+        while self.logic_lag >= self.logic_step and steps < MAX_CATCH_UP_STEPS:
+            step_end = step_start + self.logic_step
+            inputs = []
+            while self.input_queue and self.input_queue[0][0] < step_end:
+                timestamp, action = self.input_queue.popleft()
+                offset = int((timestamp - step_start) / self.logic_step * SUBFRAME_STEPS)
+                inputs.append((min(max(offset, 0), SUBFRAME_STEPS - 1), action))
+            self.engine.advance(self.logic_step, inputs)
+            self.logic_lag -= self.logic_step
+            step_start = step_end
+            steps += 1
+            if self.engine.game_over:
+                return
+        if steps == MAX_CATCH_UP_STEPS:
+            self.logic_lag = min(self.logic_lag, self.logic_step)
+
+    def check_tetromino_keydown_event(self, event: pygame.event.Event, timestamp: float):
+        action = KEYDOWN_ACTIONS.get(event.key)
+        if action is not None:
+            self.input_queue.append((timestamp, action))
+
+    def check_tetromino_keyup_event(self, event: pygame.event.Event, timestamp: float):
+        action = KEYUP_ACTIONS.get(event.key)
+        if action is not None:
+            self.input_queue.append((timestamp, action))
 
     def check_events(self):
-        for event in pygame.event.get():
+        now = perf_counter()
+        events = self.timed_events + [(now, event) for event in pygame.event.get()]
+        self.timed_events = []
+        for timestamp, event in events:
             if event.type == pygame.QUIT:
                 self.stop_game()
 
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     self.pause()
-                    self.soft_drop = False
-                    self.held_direction = 0
-                    self.last_move_time = 0
-                    self.move_held_time = 0
-                    self.tetromino.reset_fall_delay()
+                    self.input_queue.clear()
+                    self.engine.apply_input("release_all")
                     # pygame.event.clear()
                     # break
 
                 if not self.is_paused:
-                    self.check_tetromino_keydown_event(event)
+                    self.check_tetromino_keydown_event(event, timestamp)
 
             if event.type == pygame.KEYUP:
                 if not self.is_paused:
-                    self.check_tetromino_keyup_event(event)            
+                    self.check_tetromino_keyup_event(event, timestamp)
 
     def update_window(self):
-        self.win.fill(BACKGROUND_COLOR)
+        if self.is_paused != self.was_paused:
+            # Оверлей паузы перекрывает всё окно - перерисовываем целиком
+            self.renderer.invalidate()
+            self.was_paused = self.is_paused
 
-        self.print_headers()
-        self.print_stats()
-
-        self.board.draw(self.win)
-        self.hold_board.draw(self.win)
-        self.next_board.draw(self.win)
-
-        self.tetromino.draw(self.win)
+        if self.renderer.full_redraw:
+            self.win.blit(self.static_layer(), (0, 0))
 
         if self.is_paused:
-            self.win.blit(self.pause_surface, (0, 0))
-            self.hide_board.draw_gradient()
-            self.hide_board.draw(self.win)
-            pygame_widgets.update(pygame.event.get())
-
-        pygame.display.flip()
-
-    def main_menu(self):
-        pass
-
-    def get_tetromino(self):
-        if len(self.tetrominos) < 7:
-            # Refill the bag if there are less than 7 tetrominos left
-            # 7 because there are 7 unique tetrominos
-            new_bag = list(TETROMINOS.keys())
-            shuffle(new_bag)
-            self.tetrominos.extend(new_bag)
-
-        tetromino_name = self.tetrominos.pop(0)
-
-        self.next_board.reset()
-
-        for idx, shape_name in enumerate(self.tetrominos[:NUM_NEXT_BLOCKS]):
-            temp_tetromino = Tetromino(shape_name=shape_name, board=self.board)
-            temp_tetromino.swap_board(self.next_board, y=idx * 4 + 1, lock=True)
-
-        self.hold_swapped = False
-        if self.soft_drop:
-            self.soft_drop = False
-            pygame.event.post(
-                pygame.event.Event(pygame.KEYDOWN, key=pygame.K_DOWN)
-            )  # Simulate soft drop key press to reset state
-        return Tetromino(shape_name=tetromino_name, board=self.board, level=self.level)
-
-    def check_level_up(self):
-        new_level = self.total_lines_cleared // 10
-        self.level = min(new_level, MAX_LEVEL)
-        self.level_render = self.font.render(f"Level: {self.level + 1}", 0, STATS_COLOR)
-
-    def calculate_score(self):
-        update_score = False
-        if self.soft_drop and self.tetromino.lock_start == 0:
-            self.score += 1  # 1 point per soft drop cell
-            update_score = True
-        lines = self.board.check_lines()
-        if lines > 0:
-            self.total_lines_cleared += lines
-            self.score += SCORE_DATA[lines] * (self.level + 1)
-            update_score = True
-            self.lines_render = self.font.render(
-                f"Lines: {self.total_lines_cleared}", 0, STATS_COLOR
+            if self.renderer.full_redraw:
+                self.draw_game()
+                self.win.blit(self.pause_surface, (0, 0))
+            self.renderer.mark_dirty(
+                self.pause_gradient.draw(self.win, pygame.time.get_ticks() / 1000)
             )
-        if update_score:
-            self.score_render = self.font.render(f"Score: {self.score}", 0, STATS_COLOR)
+            pygame_widgets.update(pygame.event.get())
+            for button in (self.start_button, self.settings_button, self.exit_button):
+                self.renderer.mark_dirty(
+                    pygame.Rect(button.getX(), button.getY(), button.getWidth(), button.getHeight())
+                )
+        else:
+            self.draw_game()
 
-    def swap_hold(self):
-        if self.hold is None:
-            self.hold = self.tetromino
-            self.hold.swap_board(self.hold_board, y=1, lock=True)
+        if self.profiler_overlay is not None:
+            rect = self.profiler_overlay.draw(self.win, self.static_layer(), self.renderer.full_redraw)
+            if rect is not None:
+                self.renderer.mark_dirty(rect)
 
-            self.tetromino = self.get_tetromino()
-        else:
-            self.hold, self.tetromino = self.tetromino, self.hold
+        self.renderer.present()
 
-            self.hold.swap_board(self.hold_board, y=1, board_reset=True, lock=True)
+    def draw_game(self):
+        if self.stats_dirty or self.renderer.full_redraw:
+            self.stats_dirty = False
+            self.print_stats()
+            self.renderer.mark_dirty(self.stats_box)
 
-            self.tetromino.swap_board(self.board)
-        self.hold_swapped = True
+        self.renderer.draw_board(self.board_view, self.engine.tetromino.overlay())
+        self.renderer.draw_board(self.hold_view)
+        self.renderer.draw_board(self.next_view)
 
-    def _handle_das_arr(self):
-        if self.held_direction == 0:
-            return
+    def mark_stats_dirty(self, *args):
+        self.stats_dirty = True
 
-        current_time = pygame.time.get_ticks() / 1000
+    def layout_key(self) -> tuple:
+        return tuple(
+            view.layout_key() for view in (self.board_view, self.hold_view, self.next_view)
+        ) + (tuple(self.stats_box),)
 
-        if current_time - self.move_held_time >= DAS_DELAY:
+    def static_layer(self) -> pygame.Surface:
+        return self.layers.get("static", self.layout_key(), self.build_static_layer)
 
-            if current_time - self.last_move_time >= ARR_DELAY:
+    def build_static_layer(self) -> pygame.Surface:
+        layer = pygame.Surface((WIDTH, HEIGHT)).convert()
+        layer.fill(BACKGROUND_COLOR)
+        for view in (self.board_view, self.hold_view, self.next_view):
+            view.draw_lines(layer)
+        pygame.draw.rect(layer, BOARD_LINE_COLOR, self.stats_box, width=1)
+        self.print_headers(layer)
+        return layer
 
-                # Выполняем движение и сбрасываем ARR таймер
-                self.tetromino.move(self.held_direction, 0)
-                self.last_move_time = current_time
+    def main_menu(self):
+        pass
 
     def print_stats(self):
-        pygame.draw.rect(self.win, BOARD_LINE_COLOR, self.stats_box, width=1)
-
-        self.win.blit(
-            self.score_render,
-            (
-                self.stats_box.x + STATS_BOX_PADDING,
-                self.stats_box.y + STATS_BOX_PADDING,
-            ),
-        )
-        self.win.blit(
-            self.level_render,
-            (
-                self.stats_box.x + STATS_BOX_PADDING,
-                self.stats_box.y
-                + STATS_BOX_PADDING * 2
-                + self.score_render.get_height(),
-            ),
-        )
-        self.win.blit(
-            self.lines_render,
-            (
-                self.stats_box.x + STATS_BOX_PADDING,
-                self.stats_box.y
-                + STATS_BOX_PADDING * 3
-                + self.score_render.get_height()
-                + self.level_render.get_height(),
-            ),
-        )
+        # Восстанавливаем фон и рамку из статичного слоя
+        self.win.blit(self.static_layer(), self.stats_box, self.stats_box)
+
+        engine = self.engine
+        x = self.stats_box.x + STATS_BOX_PADDING
+        y = self.stats_box.y + STATS_BOX_PADDING
+        for label, value in (
+            ("Score: ", engine.score),
+            ("Level: ", engine.level + 1),
+            ("Lines: ", engine.total_lines_cleared),
+        ):
+            self.stats_texts.draw_number(self.win, (x, y), label, value, STATS_COLOR)
+            y += self.stats_line_height + STATS_BOX_PADDING
 
-    def print_headers(self):
-        self.win.blit(
+    def print_headers(self, surface: pygame.Surface):
+        surface.blit(
             self.tetris_render,
             (
-                self.board.x
+                self.board_view.x
                 + (
-                    self.board.width * self.board.block_size
+                    self.board_view.board.width * self.board_view.block_size
                     - self.tetris_render.get_width()
                 )
                 / 2,
-                self.board.y - self.tetris_render.get_height(),
+                self.board_view.y - self.tetris_render.get_height(),
             ),
         )
-        self.win.blit(
+        surface.blit(
             self.hold_render,
             (
-                self.hold_board.x
+                self.hold_view.x
                 + (
-                    self.hold_board.width * self.hold_board.block_size
+                    self.hold_view.board.width * self.hold_view.block_size
                     - self.hold_render.get_width()
                 )
                 / 2,
-                self.hold_board.y - self.hold_render.get_height(),
+                self.hold_view.y - self.hold_render.get_height(),
             ),
         )
-        self.win.blit(
+        surface.blit(
             self.next_render,
             (
-                self.next_board.x
+                self.next_view.x
                 + (
-                    self.next_board.width * self.next_board.block_size
+                    self.next_view.board.width * self.next_view.block_size
                     - self.next_render.get_width()
                 )
                 / 2,
-                self.next_board.y - self.next_render.get_height(),
+                self.next_view.y - self.next_render.get_height(),
             ),
         )
 
@@ -0,0 +1,251 @@
+from collections import OrderedDict, deque
+from math import inf
+from typing import NamedTuple
+
+from shapes import SHAPE_TABLE, KICK_TABLE, spawn_x
+
+
+# Перемещения для поиска: (имя, dx) и (имя, направление поворота).
+# Вниз фигура идёт ходом drop - сразу до места падения - или по одной
+# клетке ходом soft_drop, если по пути нужен сдвиг или поворот.
+SHIFT_MOVES = (("left", -1), ("right", 1))
+ROTATE_MOVES = (("rotate_cw", 1), ("rotate_ccw", -1))
+
+PLACEMENTS_CACHE_SIZE = 1024
+# Запас строк и столбцов вокруг поля при поиске: больше размера фигуры плюс wall kick
+SEARCH_PADDING = 6
+
+
+class Placement(NamedTuple):
+    shape_name: str
+    x: int
+    y: int
+    rotation: int
+    # Шаги из стартовой позиции: left, right, rotate_cw, rotate_ccw, soft_drop
+    # (на одну клетку) и drop (soft drop до упора, без фиксации). После них
+    # фигура лежит и её можно фиксировать.
+    path: tuple[str, ...]
+
+    @property
+    def cells(self) -> list[tuple[int, int]]:
+        x, y = self.x, self.y
+        return [(x + col, y + row) for col, row in SHAPE_TABLE[self.shape_name][self.rotation].cells]
+
+
+_cache = OrderedDict()
+
+
+def enumerate_placements(board, shape_name: str, x: int | None = None, y: int = -1, rotation: int = 0):
+    """Возвращает все различные конечные положения фигуры, достижимые из старта.
+
+    Поиск в ширину по состояниям (x, y, rotation) с учётом wall kick из
+    WALL_KICK_DATA. Фигура двигается и вращается у старта и падает ходом drop
+    на расстояние Board.drop_distance. Сдвиги и повороты пробуются из каждой
+    строки, через которую фигура пролетает, так что находятся подсовывания
+    под навесы и T-spin, в том числе с поворотом на полпути.
+    Положения с одинаковым набором клеток (например, повороты O или
+    горизонтальные I) считаются одним, для каждого берётся первый найденный путь.
+    Результаты запоминаются для последних PLACEMENTS_CACHE_SIZE полей.
+    """
+    if x is None:
+        x = spawn_x(shape_name, board.width)
+
+    key = (tuple(board.rows), board.width, shape_name, x, y, rotation)
+    placements = _cache.get(key)
+    if placements is not None:
+        _cache.move_to_end(key)
+        return placements
+
+    placements = tuple(_search(board, shape_name, (x, y, rotation)))
+    _cache[key] = placements
+    if len(_cache) > PLACEMENTS_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return placements
+
+
+def _fitter(rows: list[int], width: int, rotations):
+    """Проверка положения без вызовов Board.fits.
+
+    Строки поля сдвинуты на SEARCH_PADDING столбцов, по бокам стенки,
+    сверху свободные строки, снизу пол.
+    """
+    pad = SEARCH_PADDING
+    walls = ((1 << pad) - 1) | ((1 << pad) - 1) << (width + pad)
+    floor = (1 << (width + 2 * pad)) - 1
+    rows = [walls] * pad + [row << pad | walls for row in rows] + [floor] * pad
+    row_masks = [shape.row_masks for shape in rotations]
+
+    def fits(rotation, x, y):
+        y += pad
+        x += pad
+        if y < 0 or x < 0:
+            # Левее запаса - за стенкой, выше запаса строки как верхняя: только стенки
+            return x >= 0 and not any(rows[0] & mask << x for _, mask in row_masks[rotation])
+        for row, mask in row_masks[rotation]:
+            if rows[y + row] & mask << x:
+                return False
+        return True
+
+    return fits
+
+
+def _moves(state, rotatable, kicks, fits):
+    """Соседние состояния: сдвиги и повороты с wall kick, [(состояние, ход)]"""
+    x, y, rotation = state
+    moves = []
+    for name, dx in SHIFT_MOVES:
+        if fits(rotation, x + dx, y):
+            moves.append(((x + dx, y, rotation), name))
+    if rotatable:
+        for name, direction in ROTATE_MOVES:
+            new_rotation = (rotation + direction) % 4
+            for kick_x, kick_y in kicks.get((rotation, new_rotation), ((0, 0),)):
+                if fits(new_rotation, x + kick_x, y + kick_y):
+                    moves.append(((x + kick_x, y + kick_y, new_rotation), name))
+                    break
+    return moves
+
+
+_spawn_cache = {}
+
+
+def _spawn_moves(board, shape_name: str, start: tuple[int, int, int]) -> dict:
+    """Состояния, достижимые у старта без падения: {состояние: (родитель, ход)}.
+
+    Пока фигура не опустилась, она двигается в верхних строках поля. Если
+    они пусты, результат не зависит от поля и берётся из кэша.
+    """
+    key = (shape_name, start, board.width, board.height)
+    cached = _spawn_cache.get(key)
+    if cached is not None and not any(board.rows[:cached[1]]):
+        return cached[0]
+
+    rotations = SHAPE_TABLE[shape_name]
+    kicks = KICK_TABLE[shape_name]
+    rotatable = len({shape.cells for shape in rotations}) > 1
+    fits = _fitter(board.rows, board.width, rotations)
+    if not fits(start[2], start[0], start[1]):
+        return {}
+
+    parents = {start: None}
+    queue = deque([start])
+    while queue:
+        state = queue.popleft()
+        for next_state, name in _moves(state, rotatable, kicks, fits):
+            if next_state not in parents:
+                parents[next_state] = (state, name)
+                queue.append(next_state)
+
+    # Строки, которые задевают проверки: клетки фигур плюс wall kick вниз
+    depth = max(y for _, y, _ in parents) + max(shape.max_row for shape in rotations) + 3
+    if not any(board.rows[:depth]):
+        _spawn_cache[key] = (parents, depth)
+    return parents
+
+
+def _search(board, shape_name: str, start: tuple[int, int, int]):
+    rotations = SHAPE_TABLE[shape_name]
+    kicks = KICK_TABLE[shape_name]
+    drop_distance = board.drop_distance
+    # Если все повороты совпадают (O), вращать бессмысленно
+    rotatable = len({shape.cells for shape in rotations}) > 1
+    fits = _fitter(board.rows, board.width, rotations)
+    # Ключ положения - набор занятых клеток: угол прямоугольника и форма без смещения
+    forms = [
+        frozenset((col - shape.min_col, row - shape.min_row) for col, row in shape.cells)
+        for shape in rotations
+    ]
+    form_ids = [forms.index(form) for form in forms]
+
+    spawn = _spawn_moves(board, shape_name, start)
+    parents = dict(spawn)
+    # Самая высокая строка у старта для каждого (x, rotation): ниже неё фигура
+    # в этом столбце оказывается, просто падая от старта
+    entries = {}
+    for x, y, rotation in spawn:
+        if y < entries.get((x, rotation), board.height):
+            entries[(x, rotation)] = y
+    lowest_entry = max(entries.values(), default=0)
+    max_row = max(shape.max_row for shape in rotations)
+    # Если строки у старта пусты, положение выше строки старта ничем не
+    # отличается от положения в ней, кроме высоты
+    open_top = not any(board.rows[:lowest_entry + max_row + 5])
+
+    width = board.width
+    tops = [board.height - height for height in board.heights]
+    # Для этих столбцов: (строка старта, первая строка, где фигура уже не над стопкой)
+    open_air = {
+        (x, rotation): (
+            -inf if open_top else entry,
+            min(tops[x + col] - row for col, row in rotations[rotation].column_bottoms),
+        )
+        for (x, rotation), entry in entries.items()
+    }
+
+    def in_open_air(x, y, rotation):
+        """Положение над стопкой в столбце, куда фигура попадает, падая от старта"""
+        rows = open_air.get((x, rotation))
+        return rows is not None and rows[0] <= y < rows[1]
+
+    # Если у старта достижимы все столбцы во всех поворотах, из строк высоко над
+    # стопкой любой ход ведёт в открытый воздух - такие строки не проверяются
+    all_entries = all(
+        (x, rotation) in entries
+        for rotation, shape in enumerate(rotations)
+        for x in range(-shape.min_col, width - shape.max_col)
+    )
+
+    # Каждое состояние в очереди - начало падения по своему столбцу
+    queue = deque(spawn)
+    landed = {}
+    while queue:
+        state = queue.popleft()
+        x, y, rotation = state
+        shape = rotations[rotation]
+        bottom = y + drop_distance(shape, x, y)
+        landing = (x, bottom, rotation)
+        if landing not in parents:
+            parents[landing] = (state, "drop")
+        key = (x + shape.min_col, bottom + shape.min_row, form_ids[rotation])
+        if key not in landed:
+            landed[key] = landing
+
+        # Ходы из самой строки старта уже перебраны в _spawn_moves
+        first = y + 1 if state in spawn else y
+        skip_from = skip_to = first
+        if all_entries:
+            # Над стопкой с запасом на wall kick на две клетки по вертикали и в стороны
+            local_top = min(tops[max(0, x + shape.min_col - 2):x + shape.max_col + 3])
+            if not open_top:
+                skip_from = max(first, lowest_entry + 2)
+            skip_to = max(skip_from, local_top - max_row - 2)
+
+        for row_y in (*range(first, skip_from), *range(skip_to, bottom + 1)):
+            for next_state, name in _moves((x, row_y, rotation), rotatable, kicks, fits):
+                if next_state in parents or in_open_air(*next_state):
+                    continue
+                parents[next_state] = (_fall_to(parents, state, row_y), name)
+                queue.append(next_state)
+
+    return [
+        Placement(shape_name, x, y, rotation, _path(parents, (x, y, rotation)))
+        for x, y, rotation in landed.values()
+    ]
+
+
+def _fall_to(parents: dict, state, row_y: int):
+    """Состояние в строке row_y того же столбца, с цепочкой ходов soft_drop от state"""
+    x, y, rotation = state
+    for next_y in range(y + 1, row_y + 1):
+        next_state = (x, next_y, rotation)
+        if next_state not in parents:
+            parents[next_state] = ((x, next_y - 1, rotation), "soft_drop")
+    return (x, row_y, rotation)
+
+
+def _path(parents: dict, state) -> tuple[str, ...]:
+    path = []
+    while parents[state] is not None:
+        state, name = parents[state]
+        path.append(name)
+    return tuple(reversed(path))
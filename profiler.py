@@ -0,0 +1,68 @@
+import csv
+import json
+
+from collections import deque
+from time import perf_counter
+
+from config import PROFILE_WINDOW
+
+
+class FrameProfiler:
+    """Время выполнения секций кадра в скользящем окне последних замеров.
+
+    Секции замеряются через measure(name, func, *args). По окну считаются
+    перцентили p50/p95/p99, всё окно можно выгрузить в CSV или JSON.
+    """
+
+    def __init__(self, window: int = PROFILE_WINDOW):
+        self.window = window
+        self.samples = {}
+
+    def add(self, name: str, seconds: float):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def measure(self, name: str, func, *args):
+        start = perf_counter()
+        result = func(*args)
+        self.add(name, perf_counter() - start)
+        return result
+
+    def percentiles(self, name: str) -> tuple[float, float, float]:
+        """p50, p95, p99 в миллисекундах"""
+        ordered = sorted(self.samples[name])
+        last = len(ordered) - 1
+        return tuple(ordered[round(last * q)] * 1000 for q in (0.5, 0.95, 0.99))
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        summary = {}
+        for name, samples in self.samples.items():
+            p50, p95, p99 = self.percentiles(name)
+            summary[name] = {"p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "samples": len(samples)}
+        return summary
+
+    def dump(self, path: str):
+        """Сохраняет сводку и сами замеры: .csv - по строке на замер, иначе JSON"""
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as file:
+                writer = csv.writer(file)
+                writer.writerow(("section", "sample", "ms"))
+                for name, samples in self.samples.items():
+                    for idx, seconds in enumerate(samples):
+                        writer.writerow((name, idx, f"{seconds * 1000:.4f}"))
+            return
+
+        with open(path, "w") as file:
+            json.dump(
+                {
+                    "summary": self.summary(),
+                    "samples_ms": {
+                        name: [seconds * 1000 for seconds in samples]
+                        for name, samples in self.samples.items()
+                    },
+                },
+                file,
+                indent=2,
+            )
@@ -0,0 +1,85 @@
+from collections import deque
+from itertools import islice
+from random import Random
+
+from config import TETROMINOS, NUM_NEXT_BLOCKS, RANDOMIZER
+
+
+SHAPE_NAMES = tuple(TETROMINOS.keys())
+
+
+class BagGenerator:
+    """Мешок из copies наборов всех фигур, перемешанный целиком"""
+
+    def __init__(self, copies: int = 1):
+        self.copies = copies
+
+    def generate(self, rng: Random, last: str | None) -> list[str]:
+        bag = list(SHAPE_NAMES) * self.copies
+        rng.shuffle(bag)
+        return bag
+
+
+class MemorylessGenerator:
+    """Классический NES: случайная фигура с одним перебросом при повторе"""
+
+    def generate(self, rng: Random, last: str | None) -> list[str]:
+        roll = rng.randrange(len(SHAPE_NAMES) + 1)
+        if roll == len(SHAPE_NAMES) or SHAPE_NAMES[roll] == last:
+            roll = rng.randrange(len(SHAPE_NAMES))
+        return [SHAPE_NAMES[roll]]
+
+
+GENERATORS = {
+    "7-bag": lambda: BagGenerator(1),
+    "14-bag": lambda: BagGenerator(2),
+    "nes": MemorylessGenerator,
+}
+
+
+class Randomizer:
+    """Очередь следующих фигур со своим генератором случайных чисел.
+
+    В очереди всегда не меньше lookahead фигур после текущей, так что
+    preview() не требует генерации.
+    """
+
+    def __init__(self, seed: int | None = None, generator: str = RANDOMIZER, lookahead: int = NUM_NEXT_BLOCKS):
+        self.rng = Random(seed)
+        self.generator = GENERATORS[generator]()
+        self.lookahead = lookahead
+        self.queue = deque()
+        # Состояние rng для snapshot, сбрасывается при каждой генерации
+        self._rng_state = None
+        self._fill()
+
+    def _fill(self):
+        while len(self.queue) <= self.lookahead:
+            last = self.queue[-1] if self.queue else None
+            self.queue.extend(self.generator.generate(self.rng, last))
+            self._rng_state = None
+
+    def next(self) -> str:
+        shape_name = self.queue.popleft()
+        self._fill()
+        return shape_name
+
+    def snapshot(self) -> tuple:
+        # getstate копирует всё состояние rng - берём его один раз между генерациями
+        if self._rng_state is None:
+            self._rng_state = self.rng.getstate()
+        return self._rng_state, tuple(self.queue)
+
+    def restore(self, state: tuple):
+        rng_state, queue = state
+        if rng_state is not self._rng_state:
+            self.rng.setstate(rng_state)
+            self._rng_state = rng_state
+        self.queue = deque(queue)
+
+    def preview(self, count: int | None = None) -> list[str]:
+        count = count if count is not None else self.lookahead
+        while len(self.queue) < count:
+            self.queue.extend(self.generator.generate(self.rng, self.queue[-1]))
+            self._rng_state = None
+        return list(islice(self.queue, count))
@@ -0,0 +1,351 @@
+from collections import OrderedDict
+from math import sin
+
+import pygame
+
+try:
+    import numpy
+except ImportError:  # Без numpy градиент считается циклом по клеткам
+    numpy = None
+
+from shapes import EMPTY_CODE, CELL_CODES, GARBAGE_CODE, GHOST_CODE
+
+from config import (
+    BOARD_BLOCK_COLOR,
+    BOARD_LINE_COLOR,
+    BOARD_LINE_THICKNESS,
+    GARBAGE_BLOCK_COLOR,
+    GHOST_BLOCK_COLOR,
+    TETROMINOS_COLORS,
+    TEXT_CACHE_SIZE,
+)
+
+
+# Цвет клетки по её коду из Board.cells и Tetromino.overlay: PALETTE[code]
+_CODE_COLORS = {
+    EMPTY_CODE: BOARD_BLOCK_COLOR,
+    **{code: TETROMINOS_COLORS[name] for name, code in CELL_CODES.items()},
+    GARBAGE_CODE: GARBAGE_BLOCK_COLOR,
+    GHOST_CODE: GHOST_BLOCK_COLOR,
+}
+PALETTE = tuple(_CODE_COLORS[code] for code in range(len(_CODE_COLORS)))
+
+
+class BoardView:
+    """Положение поля в окне и его отрисовка"""
+
+    def __init__(self, board, x: float, y: float, block_size: float):
+        self.board = board
+        self.x = x
+        self.y = y
+        self.block_size = block_size
+        # Экранные координаты левого верхнего угла каждой клетки
+        self.cell_positions = [
+            [
+                (
+                    int(self.x + x * self.block_size + BOARD_LINE_THICKNESS),
+                    int(self.y + y * self.block_size + BOARD_LINE_THICKNESS),
+                )
+                for x in range(board.width)
+            ]
+            for y in range(board.height)
+        ]
+
+    def layout_key(self) -> tuple:
+        return (self.x, self.y, self.block_size, self.board.width, self.board.height)
+
+    def draw(self, surface: pygame.Surface, atlas: "BlockAtlas"):
+        self.draw_blocks(surface, atlas)
+        self.draw_lines(surface)
+
+    def draw_lines(self, surface: pygame.Surface, origin: tuple[float, float] | None = None):
+        left, top = origin if origin is not None else (self.x, self.y)
+        # Vertical lines
+        for x in range(self.board.width + 1):
+            pygame.draw.line(
+                surface,
+                BOARD_LINE_COLOR,
+                (left + x * self.block_size, top),
+                (left + x * self.block_size, top + self.board.height * self.block_size),
+                width=BOARD_LINE_THICKNESS,
+            )
+        # Horizontal lines
+        for y in range(self.board.height + 1):
+            pygame.draw.line(
+                surface,
+                BOARD_LINE_COLOR,
+                (left, top + y * self.block_size),
+                (left + self.board.width * self.block_size, top + y * self.block_size),
+                width=BOARD_LINE_THICKNESS,
+            )
+
+    def draw_blocks(self, surface: pygame.Surface, atlas: "BlockAtlas"):
+        sprites = atlas.sprites
+        blits = []
+        cells = self.board.cells
+        width = self.board.width
+        for y, positions in enumerate(self.cell_positions):
+            for position, code in zip(positions, cells[y * width:(y + 1) * width]):
+                blits.append((sprites[code], position))
+        surface.blits(blits, doreturn=False)
+
+    def draw_cells(self, surface: pygame.Surface, atlas: "BlockAtlas", cells) -> list[pygame.Rect]:
+        """Рисует клетки из (x, y, код клетки) и возвращает их прямоугольники"""
+        sprites = atlas.sprites
+        positions = self.cell_positions
+        blits = [(sprites[code], positions[y][x]) for x, y, code in cells]
+        return surface.blits(blits)
+
+
+
+class Renderer:
+    """Перерисовывает только изменившиеся области окна.
+
+    Между кадрами хранит, какие клетки каждого поля были закрашены фигурой
+    (и её тенью), и собирает прямоугольники изменившихся областей для
+    pygame.display.update. После invalidate() следующий кадр рисуется
+    целиком и выводится через pygame.display.flip().
+    """
+
+    def __init__(self, surface: pygame.Surface):
+        self.surface = surface
+        self.full_redraw = True
+        self.dirty_rects = []
+        self._overlays = {}
+        self._atlases = {}
+
+    def atlas(self, block_size: float) -> "BlockAtlas":
+        atlas = self._atlases.get(block_size)
+        if atlas is None:
+            atlas = self._atlases[block_size] = BlockAtlas(block_size)
+        return atlas
+
+    def invalidate(self):
+        self.full_redraw = True
+
+    def mark_dirty(self, rect: pygame.Rect):
+        if not self.full_redraw:
+            self.dirty_rects.append(rect)
+
+    def draw_board(self, view: BoardView, overlay: dict | None = None):
+        overlay = overlay or {}
+        old_overlay = self._overlays.get(view, {})
+        self._overlays[view] = overlay
+        dirty_rows = view.board.take_dirty_rows()
+        atlas = self.atlas(view.block_size)
+
+        if self.full_redraw:
+            # Линии сетки уже есть в статичном слое
+            view.draw_blocks(self.surface, atlas)
+            view.draw_cells(self.surface, atlas, ((x, y, code) for (x, y), code in overlay.items()))
+            return
+
+        width = view.board.width
+        dirty_cells = {
+            (x, y) for y in range(dirty_rows.bit_length()) if dirty_rows >> y & 1 for x in range(width)
+        }
+        for cell in old_overlay.keys() | overlay.keys():
+            if old_overlay.get(cell) != overlay.get(cell):
+                dirty_cells.add(cell)
+        if not dirty_cells:
+            return
+
+        cells = view.board.cells
+        rects = view.draw_cells(
+            self.surface,
+            atlas,
+            ((x, y, overlay.get((x, y), cells[y * width + x])) for x, y in dirty_cells),
+        )
+        self.dirty_rects.append(rects[0].unionall(rects[1:]))
+
+    def present(self):
+        if self.full_redraw:
+            pygame.display.flip()
+        elif self.dirty_rects:
+            pygame.display.update(self.dirty_rects)
+        self.full_redraw = False
+        self.dirty_rects = []
+
+
+class BlockAtlas:
+    """Заранее отрисованные спрайты блоков: sprites[code] - спрайт клетки с кодом code"""
+
+    def __init__(self, block_size: float):
+        self.size = int(block_size - BOARD_LINE_THICKNESS)
+        self.sprites = tuple(self.build_sprite(color) for color in PALETTE)
+
+    def build_sprite(self, color) -> pygame.Surface:
+        sprite = pygame.Surface((self.size, self.size))
+        sprite.fill(color)
+        return sprite
+
+
+class PauseGradient:
+    """Анимированный градиент, закрывающий поле во время паузы.
+
+    Цвет считается по одному пикселю на клетку в маленькую поверхность
+    размером с поле, которая затем масштабируется до размера поля на экране.
+    """
+
+    def __init__(self, view: BoardView):
+        board = view.board
+        self.board = board
+        self.rect = pygame.Rect(
+            view.x,
+            view.y,
+            board.width * view.block_size + BOARD_LINE_THICKNESS,
+            board.height * view.block_size + BOARD_LINE_THICKNESS,
+        )
+        self._pixels = pygame.Surface((board.width, board.height))
+        self._scaled = pygame.Surface(self.rect.size)
+
+        self._lines = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        view.draw_lines(self._lines, origin=(view.x - self.rect.x, view.y - self.rect.y))
+
+        if numpy is not None:
+            # surfarray индексируется как [x, y]
+            self._columns = numpy.arange(board.width, dtype=float)[:, None]
+            self._rows = numpy.arange(board.height, dtype=float)[None, :]
+            self._field = numpy.empty((board.width, board.height, 3), dtype=numpy.uint8)
+
+    def _fill_pixels(self, phase: float):
+        if numpy is None:
+            for row in range(self.board.height):
+                for column in range(self.board.width):
+                    r = int((sin((row + phase) * 0.5) + 1) * 128)
+                    g = int((sin((column + phase) * 0.5) + 1) * 128)
+                    b = int((sin((row + column + phase) * 0.5) + 1) * 128)
+                    self._pixels.set_at((column, row), (min(r, 255), min(g, 255), min(b, 255)))
+            return
+
+        field = self._field
+        field[..., 0] = numpy.minimum((numpy.sin((self._rows + phase) * 0.5) + 1) * 128, 255)
+        field[..., 1] = numpy.minimum((numpy.sin((self._columns + phase) * 0.5) + 1) * 128, 255)
+        field[..., 2] = numpy.minimum(
+            (numpy.sin((self._rows + self._columns + phase) * 0.5) + 1) * 128, 255
+        )
+        pygame.surfarray.blit_array(self._pixels, field)
+
+    def draw(self, surface: pygame.Surface, current_time: float) -> pygame.Rect:
+        self._fill_pixels(current_time * 1.5)
+        pygame.transform.scale(self._pixels, self.rect.size, self._scaled)
+        surface.blit(self._scaled, self.rect)
+        return surface.blit(self._lines, self.rect)
+
+
+class ProfilerOverlay:
+    """Таблица p50/p95/p99 по секциям кадра в правом нижнем углу окна"""
+
+    def __init__(self, profiler, font: pygame.font.Font, anchor: tuple[int, int], color, refresh: int):
+        self.profiler = profiler
+        self.font = font
+        self.anchor = anchor
+        self.color = color
+        self.refresh = refresh
+        self.frames = 0
+        self.lines = []
+        self.rect = None
+
+    def _render_lines(self):
+        self.lines = [self.font.render("section          p50    p95    p99 ms", 1, self.color)]
+        for name in sorted(self.profiler.samples):
+            p50, p95, p99 = self.profiler.percentiles(name)
+            self.lines.append(
+                self.font.render(f"{name:<15}{p50:6.2f} {p95:6.2f} {p99:6.2f}", 1, self.color)
+            )
+
+    def draw(self, surface: pygame.Surface, background: pygame.Surface, force: bool = False) -> pygame.Rect | None:
+        """Рисует оверлей, если он обновился; возвращает изменившуюся область"""
+        self.frames += 1
+        updated = self.frames % self.refresh == 0
+        if updated:
+            self._render_lines()
+        if not (updated or force) or not self.lines:
+            return None
+
+        width = max(line.get_width() for line in self.lines)
+        height = sum(line.get_height() for line in self.lines)
+        rect = pygame.Rect(0, 0, width, height)
+        rect.bottomright = self.anchor
+
+        dirty = rect if self.rect is None else rect.union(self.rect)
+        surface.blit(background, dirty, dirty)
+        y = rect.y
+        for line in self.lines:
+            surface.blit(line, (rect.x, y))
+            y += line.get_height()
+        self.rect = rect
+        return dirty
+
+
+class LayerCache:
+    """Хранит заранее отрисованные статичные слои.
+
+    Слой строится заново только когда меняется его ключ (раскладка окна,
+    размер блока и т.п.).
+    """
+
+    def __init__(self):
+        self._layers = {}
+
+    def get(self, name: str, key, build) -> pygame.Surface:
+        cached = self._layers.get(name)
+        if cached is None or cached[0] != key:
+            cached = (key, build())
+            self._layers[name] = cached
+        return cached[1]
+
+    def clear(self):
+        self._layers.clear()
+
+
+class TextCache:
+    """Отрендеренные тексты по (текст, цвет) в LRU на max_size записей.
+
+    Для цветов из digit_colors цифры рендерятся заранее, и числа
+    собираются из готовых глифов без растеризации шрифта.
+    """
+
+    def __init__(
+        self,
+        font: pygame.font.Font,
+        antialias: bool = True,
+        digit_colors=(),
+        max_size: int = TEXT_CACHE_SIZE,
+    ):
+        self.font = font
+        self.antialias = antialias
+        self.max_size = max_size
+        self._texts = OrderedDict()
+        self._digits = {color: self._render_digits(color) for color in digit_colors}
+
+    def _render_digits(self, color) -> dict[str, pygame.Surface]:
+        return {digit: self.font.render(digit, self.antialias, color) for digit in "0123456789"}
+
+    def render(self, text: str, color) -> pygame.Surface:
+        key = (text, color)
+        rendered = self._texts.get(key)
+        if rendered is not None:
+            self._texts.move_to_end(key)
+            return rendered
+
+        rendered = self.font.render(text, self.antialias, color)
+        self._texts[key] = rendered
+        if len(self._texts) > self.max_size:
+            self._texts.popitem(last=False)
+        return rendered
+
+    def draw_number(self, surface: pygame.Surface, position, label: str, value: int, color) -> pygame.Rect:
+        """Рисует подпись и число из глифов цифр, возвращает занятую область"""
+        digits = self._digits.get(color)
+        if digits is None:
+            digits = self._digits[color] = self._render_digits(color)
+
+        label_render = self.render(label, color)
+        rect = surface.blit(label_render, position)
+        x = rect.right
+        for digit in str(value):
+            glyph = digits[digit] if digit in digits else self.render(digit, color)
+            rect.union_ip(surface.blit(glyph, (x, position[1])))
+            x += glyph.get_width()
+        return rect
@@ -0,0 +1,171 @@
+import argparse
+import struct
+
+from bisect import bisect_right
+
+from engine import Engine, SUBFRAME_STEPS
+
+from config import LOGIC_RATE, REPLAY_SNAPSHOT_INTERVAL
+
+
+# Заголовок: сигнатура, версия, seed мешка фигур, частота логических кадров
+HEADER = struct.Struct("<4sBQH")
+MAGIC = b"TRPL"
+# 2: очередь фигур из randomizer.Randomizer, 3: падение на несколько клеток за шаг,
+# 4: время ввода внутри шага
+VERSION = 4
+
+# Запись события: кадров с прошлого события, код действия, доля шага
+RECORD = struct.Struct("<HBB")
+MAX_DELTA = 0xFFFF
+
+# Коды действий - индексы в Engine.INPUT_ACTIONS, плюс служебные
+WAIT_CODE = 0xFE  # только сдвигает время, если пауза между событиями > MAX_DELTA
+END_CODE = 0xFF  # последний кадр записи
+# Доля шага для действий между шагами (Engine.apply_input без offset)
+NO_OFFSET = SUBFRAME_STEPS
+
+ACTION_CODES = {action: code for code, action in enumerate(Engine.INPUT_ACTIONS)}
+
+
+class Recorder:
+    """Пишет ввод игры в компактный бинарный поток.
+
+    Каждое событие - запись фиксированного размера RECORD: разница в
+    логических кадрах с прошлым событием, код действия и время внутри шага
+    в SUBFRAME_STEPS-х долях шага. record подписывается
+    на событие input движка: engine.events.subscribe("input", recorder.record).
+    """
+
+    def __init__(self, file, seed: int, tick_rate: int = LOGIC_RATE):
+        self.file = file
+        self.last_frame = 0
+        file.write(HEADER.pack(MAGIC, VERSION, seed, tick_rate))
+
+    def _write(self, frame: int, code: int, offset: int = NO_OFFSET):
+        delta = frame - self.last_frame
+        while delta > MAX_DELTA:
+            self.file.write(RECORD.pack(MAX_DELTA, WAIT_CODE, NO_OFFSET))
+            delta -= MAX_DELTA
+        self.file.write(RECORD.pack(delta, code, offset))
+        self.last_frame = frame
+
+    def record(self, frame: int, action: str, offset: int | None = None):
+        self._write(frame, ACTION_CODES[action], NO_OFFSET if offset is None else offset)
+
+    def close(self, frame: int):
+        self._write(frame, END_CODE)
+        self.file.close()
+
+
+def read_replay(data: bytes) -> tuple[int, int, list[tuple[int, int, int]]]:
+    """Возвращает seed, частоту кадров и список (кадр, код действия, доля шага)"""
+    magic, version, seed, tick_rate = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a replay file or unsupported replay version")
+
+    events = []
+    frame = 0
+    for delta, code, offset in RECORD.iter_unpack(memoryview(data)[HEADER.size:]):
+        frame += delta
+        if code != WAIT_CODE:
+            events.append((frame, code, offset))
+    return seed, tick_rate, events
+
+
+class ReplayPlayer:
+    """Проигрывает запись на headless Engine с максимальной скоростью.
+
+    По ходу проигрывания каждые REPLAY_SNAPSHOT_INTERVAL кадров сохраняются
+    снимки состояния, по которым seek() быстро переходит к любому кадру.
+    """
+
+    def __init__(self, data: bytes, snapshot_interval: int = REPLAY_SNAPSHOT_INTERVAL):
+        self.seed, self.tick_rate, self.events = read_replay(data)
+        self.snapshot_interval = snapshot_interval
+        self.end_frame = self.events[-1][0] if self.events and self.events[-1][1] == END_CODE else None
+        self.engine = Engine(seed=self.seed)
+        self.next_event = 0
+        # Снимки (кадр, индекс следующего события, Engine.snapshot()), по возрастанию кадра
+        self.snapshots = [(0, 0, self.engine.snapshot())]
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "ReplayPlayer":
+        with open(path, "rb") as file:
+            return cls(file.read(), **kwargs)
+
+    def play(self, until: int | None = None) -> Engine:
+        """Проигрывает до кадра until (или до конца записи) и возвращает движок.
+
+        При until события кадра until ещё не применены, при проигрывании до
+        конца применяются все события, включая последний кадр.
+        """
+        to_end = until is None
+        if to_end:
+            if self.end_frame is not None:
+                until = self.end_frame
+            else:
+                until = self.events[-1][0] if self.events else 0
+
+        engine = self.engine
+        dt = 1 / self.tick_rate
+        while engine.frame < until and not engine.game_over:
+            self._apply_events()
+            engine.advance(dt, self._step_inputs(engine.frame + 1))
+            if engine.frame % self.snapshot_interval == 0 and engine.frame > self.snapshots[-1][0]:
+                self.snapshots.append((engine.frame, self.next_event, engine.snapshot()))
+        if to_end and not engine.game_over:
+            self._apply_events()
+        return engine
+
+    def _apply_events(self):
+        """Применяет действия между шагами, записанные на текущем кадре"""
+        events = self.events
+        engine = self.engine
+        while self.next_event < len(events) and events[self.next_event][0] == engine.frame:
+            _, code, offset = events[self.next_event]
+            if offset != NO_OFFSET:
+                break
+            if code != END_CODE:
+                engine.apply_input(Engine.INPUT_ACTIONS[code])
+            self.next_event += 1
+
+    def _step_inputs(self, frame: int) -> list[tuple[int, str]]:
+        """Действия с временем внутри шага, который сделает кадр frame"""
+        events = self.events
+        inputs = []
+        while self.next_event < len(events) and events[self.next_event][0] == frame:
+            _, code, offset = events[self.next_event]
+            if offset == NO_OFFSET:
+                break
+            inputs.append((offset, Engine.INPUT_ACTIONS[code]))
+            self.next_event += 1
+        return inputs
+
+    def seek(self, frame: int) -> Engine:
+        """Переходит к кадру frame через ближайший предыдущий снимок"""
+        idx = bisect_right([snapshot[0] for snapshot in self.snapshots], frame) - 1
+        snapshot_frame, next_event, state = self.snapshots[idx]
+        if frame < self.engine.frame or snapshot_frame > self.engine.frame:
+            self.engine.restore(state)
+            self.next_event = next_event
+        return self.play(frame)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play a recorded game headlessly")
+    parser.add_argument("path")
+    parser.add_argument("--seek", type=int, help="stop at this logic frame")
+    args = parser.parse_args(argv)
+
+    player = ReplayPlayer.load(args.path)
+    engine = player.seek(args.seek) if args.seek is not None else player.play()
+    print(
+        f"frame: {engine.frame}, score: {engine.score}, "
+        f"lines: {engine.total_lines_cleared}, level: {engine.level + 1}, "
+        f"game over: {engine.game_over}"
+    )
+
+
+if __name__ == "__main__":
+    main()
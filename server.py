@@ -0,0 +1,323 @@
+import argparse
+import asyncio
+import struct
+import sys
+
+from multiprocessing import Process
+from random import Random
+
+from engine import Engine
+
+from config import (
+    BOARD_SIZE,
+    LOGIC_RATE,
+    MAX_CATCH_UP_STEPS,
+    GARBAGE_LINES,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_WORKERS,
+    SERVER_STATE_INTERVAL,
+    SERVER_MAX_BUFFERED,
+    SERVER_MAX_INPUTS_PER_TICK,
+)
+
+
+# Сообщения - структуры фиксированного размера, первый байт - тип.
+# Клиент -> сервер
+MSG_JOIN = 1
+MSG_INPUT = 2
+# Сервер -> клиент
+MSG_START = 3
+MSG_STATE = 4
+MSG_GARBAGE = 5
+MSG_END = 6
+
+JOIN = struct.Struct("<BI")  # тип, номер комнаты
+INPUT = struct.Struct("<BBB")  # тип, код действия из Engine.INPUT_ACTIONS, доля шага
+START = struct.Struct("<BQB")  # тип, seed, номер игрока в комнате
+# тип, номер игрока, кадр, очки, линии, код фигуры (shapes.CELL_CODES), x, y, поворот, строки поля (bitboard)
+STATE = struct.Struct(f"<BBIIHBbbB{BOARD_SIZE[1]}H")
+GARBAGE = struct.Struct("<BBB")  # тип, строк мусора, столбец дыры
+END = struct.Struct("<BB")  # тип, 1 - победа
+
+SERVER_MESSAGES = {
+    MSG_START: START,
+    MSG_STATE: STATE,
+    MSG_GARBAGE: GARBAGE,
+    MSG_END: END,
+}
+
+
+def shard_port(room_id: int, port: int = SERVER_PORT, workers: int = SERVER_WORKERS) -> int:
+    """Порт процесса, который обслуживает комнату room_id"""
+    return port + room_id % workers
+
+
+class Player:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.engine = None
+        # Ввод, пришедший с прошлого шага: [(доля шага, действие)]
+        self.inputs = []
+
+    def send(self, message: bytes):
+        if self.writer.is_closing():
+            return
+        if self.writer.transport.get_write_buffer_size() > SERVER_MAX_BUFFERED:
+            # Клиент не успевает читать - отключаем, а не копим память
+            self.writer.transport.abort()
+            return
+        self.writer.write(message)
+
+
+class Room:
+    """Матч двух игроков с общим seed; мусор за линии уходит сопернику"""
+
+    def __init__(self, room_id: int, seed: int):
+        self.room_id = room_id
+        self.seed = seed
+        self.rng = Random(seed)
+        self.players = []
+        self.started = False
+        self.finished = False
+
+    def join(self, player: Player) -> bool:
+        if self.started or len(self.players) == 2:
+            return False
+        self.players.append(player)
+        if len(self.players) == 2:
+            self.start()
+        return True
+
+    def start(self):
+        self.started = True
+        for idx, player in enumerate(self.players):
+            player.engine = Engine(seed=self.seed)
+            opponent = self.players[1 - idx]
+            player.engine.events.subscribe(
+                "lines_cleared", lambda lines, opponent=opponent: self.send_garbage(opponent, lines)
+            )
+            player.send(START.pack(MSG_START, self.seed, idx))
+
+    def send_garbage(self, player: Player, lines: int):
+        garbage = GARBAGE_LINES[lines]
+        if garbage and not player.engine.game_over:
+            hole = self.rng.randrange(BOARD_SIZE[0])
+            player.engine.receive_garbage(garbage, hole)
+            player.send(GARBAGE.pack(MSG_GARBAGE, garbage, hole))
+
+    def tick(self, dt: float, send_state: bool):
+        for player in self.players:
+            player.engine.advance(dt, player.inputs)
+            player.inputs = []
+
+        if send_state:
+            states = [self.state(idx) for idx in range(len(self.players))]
+            for player in self.players:
+                for state in states:
+                    player.send(state)
+
+        if any(player.engine.game_over for player in self.players):
+            # При одновременном проигрыше побеждает тот, у кого больше очков
+            alive = [not player.engine.game_over for player in self.players]
+            if not any(alive):
+                scores = [player.engine.score for player in self.players]
+                alive = [score == max(scores) for score in scores]
+            self.finish(alive)
+
+    def state(self, idx: int) -> bytes:
+        engine = self.players[idx].engine
+        tetromino = engine.tetromino
+        return STATE.pack(
+            MSG_STATE,
+            idx,
+            engine.frame,
+            engine.score,
+            engine.total_lines_cleared,
+            tetromino.code,
+            tetromino.x,
+            tetromino.y,
+            tetromino.rotation,
+            *engine.board.rows,
+        )
+
+    def leave(self, player: Player):
+        if self.finished:
+            return
+        if not self.started:
+            self.players.remove(player)
+            self.finished = not self.players
+            return
+        self.finish([other is not player for other in self.players])
+
+    def finish(self, won):
+        self.finished = True
+        for player, player_won in zip(self.players, won):
+            player.send(END.pack(MSG_END, player_won))
+            player.writer.close()
+
+
+class Shard:
+    """Комнаты одного процесса. Все комнаты делают шаг по одному общему таймеру."""
+
+    def __init__(self, index: int, workers: int, tick_rate: int = LOGIC_RATE):
+        self.index = index
+        self.workers = workers
+        self.tick_rate = tick_rate
+        self.rooms = {}
+        self.rng = Random()
+        self.ticks = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        player = Player(writer)
+        room = None
+        try:
+            msg, room_id = JOIN.unpack(await reader.readexactly(JOIN.size))
+            if msg != MSG_JOIN or room_id % self.workers != self.index:
+                return
+            room = self.rooms.get(room_id)
+            if room is None or room.finished:
+                room = self.rooms[room_id] = Room(room_id, self.rng.randrange(2**64))
+            if not room.join(player):
+                room = None
+                return
+
+            while True:
+                msg, code, offset = INPUT.unpack(await reader.readexactly(INPUT.size))
+                if msg != MSG_INPUT or code >= len(Engine.INPUT_ACTIONS):
+                    break
+                # Сверх лимита за шаг ввод отбрасывается, чтобы поток сообщений не копился в памяти
+                if room.started and not room.finished and len(player.inputs) < SERVER_MAX_INPUTS_PER_TICK:
+                    player.inputs.append((offset, Engine.INPUT_ACTIONS[code]))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if room is not None:
+                room.leave(player)
+            writer.close()
+
+    def tick(self, dt: float):
+        self.ticks += 1
+        send_state = self.ticks % SERVER_STATE_INTERVAL == 0
+        finished = []
+        for room_id, room in self.rooms.items():
+            if room.started and not room.finished:
+                room.tick(dt, send_state)
+            if room.finished:
+                finished.append(room_id)
+        for room_id in finished:
+            del self.rooms[room_id]
+
+    async def run_ticks(self):
+        loop = asyncio.get_running_loop()
+        dt = 1 / self.tick_rate
+        next_tick = loop.time()
+        while True:
+            next_tick += dt
+            self.tick(dt)
+            delay = next_tick - loop.time()
+            if delay < -dt * MAX_CATCH_UP_STEPS:
+                # Процесс перегружен - не догоняем пропущенные шаги
+                next_tick = loop.time()
+            await asyncio.sleep(max(delay, 0))
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle, host, port + self.index)
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.run_ticks())
+
+
+def run_shard(index: int, workers: int, host: str, port: int):
+    try:
+        asyncio.run(Shard(index, workers).serve(host, port))
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(host: str = SERVER_HOST, port: int = SERVER_PORT, workers: int = SERVER_WORKERS):
+    """Запускает по процессу на каждый шард комнат"""
+    processes = [
+        Process(target=run_shard, args=(index, workers, host, port), daemon=True)
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+
+
+async def read_message(reader: asyncio.StreamReader) -> tuple:
+    msg = (await reader.readexactly(1))[0]
+    message = SERVER_MESSAGES[msg]
+    return message.unpack(bytes([msg]) + await reader.readexactly(message.size - 1))
+
+
+async def bot_client(room_id: int, host: str, port: int, workers: int, seed: int, actions_per_second: float):
+    """Клиент для проверки сервера на localhost: жмёт случайные клавиши до конца матча"""
+    reader, writer = await asyncio.open_connection(host, shard_port(room_id, port, workers))
+    writer.write(JOIN.pack(MSG_JOIN, room_id))
+    rng = Random(seed)
+    received = {msg: 0 for msg in SERVER_MESSAGES}
+
+    async def send_inputs():
+        while True:
+            await asyncio.sleep(rng.expovariate(actions_per_second))
+            code = rng.randrange(len(Engine.INPUT_ACTIONS))
+            writer.write(INPUT.pack(MSG_INPUT, code, rng.randrange(255)))
+
+    sender = None
+    won = None
+    try:
+        while True:
+            message = await read_message(reader)
+            received[message[0]] += 1
+            if message[0] == MSG_START:
+                sender = asyncio.create_task(send_inputs())
+            elif message[0] == MSG_END:
+                won = bool(message[1])
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        if sender is not None:
+            sender.cancel()
+        writer.close()
+    return won, received
+
+
+async def run_bots(rooms: int, host: str, port: int, workers: int, actions_per_second: float):
+    results = await asyncio.gather(
+        *(
+            bot_client(room_id, host, port, workers, room_id * 2 + idx, actions_per_second)
+            for room_id in range(rooms)
+            for idx in range(2)
+        )
+    )
+    finished = sum(won is not None for won, _ in results)
+    messages = sum(sum(received.values()) for _, received in results)
+    print(f"clients: {len(results)}, finished: {finished}, messages received: {messages}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Versus mode server with garbage exchange")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("serve", help="run the server")
+    bots = commands.add_parser("bots", help="play random bot matches against a running server")
+    bots.add_argument("--rooms", type=int, default=100)
+    bots.add_argument("--actions-per-second", type=float, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.host, args.port, args.workers)
+    else:
+        asyncio.run(run_bots(args.rooms, args.host, args.port, args.workers, args.actions_per_second))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+from typing import NamedTuple
+
+from config import TETROMINOS, WALL_KICK_DATA
+
+
+class ShapeRotation(NamedTuple):
+    # ((col, row), ...) - смещения занятых клеток относительно (x, y) фигуры
+    cells: tuple[tuple[int, int], ...]
+    # ((row, mask), ...) - битовые маски непустых строк, бит col = столбец col
+    row_masks: tuple[tuple[int, int], ...]
+    # Ограничивающий прямоугольник занятых клеток
+    min_col: int
+    max_col: int
+    min_row: int
+    max_row: int
+    # ((col, row), ...) - самая нижняя занятая клетка в каждом столбце
+    column_bottoms: tuple[tuple[int, int], ...]
+
+
+def _build_rotation(matrix) -> ShapeRotation:
+    cells = tuple(
+        (col_idx, row_idx)
+        for row_idx, row in enumerate(matrix)
+        for col_idx, cell in enumerate(row)
+        if cell
+    )
+
+    masks = {}
+    bottoms = {}
+    for col, row in cells:
+        masks[row] = masks.get(row, 0) | 1 << col
+        bottoms[col] = max(bottoms.get(col, row), row)
+
+    cols = [col for col, _ in cells]
+    rows = [row for _, row in cells]
+    return ShapeRotation(
+        cells=cells,
+        row_masks=tuple(sorted(masks.items())),
+        min_col=min(cols),
+        max_col=max(cols),
+        min_row=min(rows),
+        max_row=max(rows),
+        column_bottoms=tuple(sorted(bottoms.items())),
+    )
+
+
+# Таблица фигур, строится один раз при импорте: SHAPE_TABLE[name][rotation]
+SHAPE_TABLE = {
+    name: tuple(_build_rotation(matrix) for matrix in rotations)
+    for name, rotations in TETROMINOS.items()
+}
+
+
+# Офсеты wall kick для каждой фигуры: KICK_TABLE[name][(from_rotation, to_rotation)]
+KICK_TABLE = {
+    name: WALL_KICK_DATA["I"] if name == "I" else WALL_KICK_DATA["default"]
+    for name in TETROMINOS
+}
+
+
+# Коды клеток поля (Board.cells): 0 - пусто, фигуры с 1, затем мусор.
+# GHOST_CODE - тень фигуры, на поле не записывается
+EMPTY_CODE = 0
+CELL_CODES = {name: code for code, name in enumerate(TETROMINOS, start=1)}
+GARBAGE_CODE = len(CELL_CODES) + 1
+GHOST_CODE = GARBAGE_CODE + 1
+
+
+def spawn_x(shape_name: str, board_width: int) -> int:
+    if shape_name == "O":
+        return board_width // 2 - 1
+    return board_width // 2 - 2
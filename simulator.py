@@ -0,0 +1,311 @@
+import argparse
+import json
+import os
+import sys
+
+from collections import deque
+from multiprocessing import Pool
+from random import Random
+from statistics import mean
+from typing import NamedTuple
+
+from engine import Engine, fill_level_speeds
+from evaluation import BoardFeatures
+from placements import enumerate_placements
+from randomizer import Randomizer, GENERATORS
+from tetromino import Tetromino
+
+from config import LOGIC_RATE, LEVEL_SPEEDS, LOCK_DELAY, DAS_DELAY, ARR_DELAY, RANDOMIZER
+
+
+class PiecePolicy:
+    """Политика, которая выбирает все действия сразу, когда появляется фигура.
+
+    Политики вызываются на каждом шаге логики и возвращают действия этого шага;
+    наследники реализуют piece_actions(engine) - действия для новой фигуры.
+    """
+
+    piece_count = None
+
+    def __call__(self, engine: Engine) -> list[str]:
+        if engine.piece_count == self.piece_count:
+            return []
+        self.piece_count = engine.piece_count
+        return self.piece_actions(engine)
+
+
+class RandomPolicy(PiecePolicy):
+    """Случайный поворот и сдвиг, затем жёсткое падение"""
+
+    def __init__(self, seed: int | None = None):
+        self.rng = Random(seed)
+
+    def piece_actions(self, engine: Engine) -> list[str]:
+        actions = ["rotate_cw"] * self.rng.randint(0, 3)
+        shift = self.rng.randint(-5, 5)
+        direction = "left" if shift < 0 else "right"
+        actions += [f"{direction}_press", f"{direction}_release"] * abs(shift)
+        actions.append("hard_drop")
+        return actions
+
+
+class ScriptedPolicy(PiecePolicy):
+    """Повторяет заданные списки действий по кругу, по одному на фигуру"""
+
+    def __init__(self, script: list[list[str]]):
+        self.script = script
+        self.piece = 0
+
+    def piece_actions(self, engine: Engine) -> list[str]:
+        actions = self.script[self.piece % len(self.script)]
+        self.piece += 1
+        return actions
+
+
+class IdlePolicy:
+    """Ничего не нажимает - фигуры падают сами"""
+
+    def __init__(self, seed: int | None = None):
+        pass
+
+    def __call__(self, engine: Engine) -> list[str]:
+        return []
+
+
+class GreedyPolicy:
+    """Ставит фигуру в лучшее по evaluation.BoardFeatures положение из placements.
+
+    Путь к положению проходится по шагам логики, как его прошёл бы игрок:
+    одно действие за шаг, сдвиг на несколько клеток - удержанием клавиши
+    (DAS и ARR), спуск - удержанием soft drop, в конце жёсткое падение.
+    Поэтому на результат влияют скорости уровней и задержки DAS, ARR и фиксации.
+    """
+
+    def __init__(self, seed: int | None = None):
+        self.features = None
+        self.piece_count = None
+        # [(ход пути, (x, y, rotation) после хода)]
+        self.plan = deque()
+        # Зажатая клавиша: (left, right или soft_drop, цель - x, y или None до упора)
+        self.held = None
+
+    def __call__(self, engine: Engine) -> list[str]:
+        if self.features is None:
+            self.features = BoardFeatures(engine.board)
+
+        actions = []
+        tetromino = engine.tetromino
+        if engine.piece_count != self.piece_count:
+            self.piece_count = engine.piece_count
+            if self.held is not None:
+                actions.append(f"{self.held[0]}_release")
+                self.held = None
+            self.plan = self.make_plan(engine)
+
+        if self.held is not None:
+            if not self.reached(tetromino, *self.held):
+                return actions
+            actions.append(f"{self.held[0]}_release")
+            self.held = None
+
+        if not self.plan:
+            actions.append("hard_drop")
+            return actions
+
+        move, (x, y, _) = self.plan.popleft()
+        if move in ("left", "right"):
+            # Подряд идущие сдвиги в одну сторону - одно нажатие с удержанием
+            while self.plan and self.plan[0][0] == move:
+                _, (x, y, _) = self.plan.popleft()
+            actions.append(f"{move}_press")
+            if abs(x - tetromino.x) > 1:
+                self.held = (move, x)
+            else:
+                actions.append(f"{move}_release")
+        elif move == "soft_drop":
+            while self.plan and self.plan[0][0] == move:
+                _, (x, y, _) = self.plan.popleft()
+            actions.append("soft_drop_press")
+            self.held = ("soft_drop", y)
+        elif move == "drop":
+            if self.plan:
+                actions.append("soft_drop_press")
+                self.held = ("soft_drop", None)
+            else:
+                actions.append("hard_drop")
+        else:
+            actions.append(move)
+        return actions
+
+    def make_plan(self, engine: Engine) -> deque:
+        tetromino = engine.tetromino
+        placements = enumerate_placements(
+            engine.board, tetromino.shape_name, tetromino.x, tetromino.y, tetromino.rotation
+        )
+        if not placements:
+            return deque()
+        best = max(placements, key=self.features.score_placement)
+
+        # Положения после каждого хода - цели для удержания клавиш
+        scratch = Tetromino(tetromino.shape_name, engine.board)
+        scratch.x, scratch.y, scratch.rotation = tetromino.x, tetromino.y, tetromino.rotation
+        plan = deque()
+        for move in best.path:
+            if move == "left":
+                scratch.x -= 1
+            elif move == "right":
+                scratch.x += 1
+            elif move == "soft_drop":
+                scratch.y += 1
+            elif move == "drop":
+                scratch.y += engine.board.drop_distance(scratch.shape, scratch.x, scratch.y)
+            else:
+                scratch.rotate(1 if move == "rotate_cw" else -1)
+            plan.append((move, (scratch.x, scratch.y, scratch.rotation)))
+        return plan
+
+    def reached(self, tetromino, key: str, target) -> bool:
+        if key == "soft_drop":
+            return tetromino.drop_distance() == 0 or (target is not None and tetromino.y >= target)
+        direction = -1 if key == "left" else 1
+        # Цель достигнута, проскочена автоповтором или дальше не пустит стопка
+        return (tetromino.x - target) * direction >= 0 or not tetromino.is_valid_position(direction, 0)
+
+
+POLICIES = {
+    "greedy": GreedyPolicy,
+    "random": RandomPolicy,
+    "idle": IdlePolicy,
+}
+
+
+class GameJob(NamedTuple):
+    seed: int
+    policy: str = "greedy"
+    script: list[list[str]] | None = None
+    max_frames: int = LOGIC_RATE * 60 * 10
+    randomizer: str = RANDOMIZER
+    level_speeds: dict[int, float] = LEVEL_SPEEDS
+    lock_delay: float = LOCK_DELAY
+    das_delay: float = DAS_DELAY
+    arr_delay: float = ARR_DELAY
+
+
+class GameResult(NamedTuple):
+    seed: int
+    score: int
+    lines: int
+    level: int
+    pieces: int
+    frames: int
+    game_over: bool
+
+
+def play_game(job: GameJob) -> GameResult:
+    engine = Engine(
+        randomizer=Randomizer(job.seed, generator=job.randomizer),
+        level_speeds=job.level_speeds,
+        lock_delay=job.lock_delay,
+        das_delay=job.das_delay,
+        arr_delay=job.arr_delay,
+    )
+    if job.script is not None:
+        policy = ScriptedPolicy(job.script)
+    else:
+        policy = POLICIES[job.policy](job.seed)
+
+    # Фигуры считаются по фиксации: обмен с hold тоже меняет piece_count
+    pieces = 0
+
+    def count_piece(tetromino):
+        nonlocal pieces
+        pieces += 1
+
+    engine.events.subscribe("lock", count_piece)
+
+    dt = 1 / LOGIC_RATE
+    while not engine.game_over and engine.frame < job.max_frames:
+        for action in policy(engine):
+            engine.apply_input(action)
+            if engine.game_over:
+                break
+        engine.advance(dt)
+
+    return GameResult(
+        seed=job.seed,
+        score=engine.score,
+        lines=engine.total_lines_cleared,
+        level=engine.level,
+        pieces=pieces,
+        frames=engine.frame,
+        game_over=engine.game_over,
+    )
+
+
+def run_batch(jobs, workers: int | None = None):
+    """Играет игры в пуле процессов и отдаёт результаты по мере завершения"""
+    with Pool(workers) as pool:
+        yield from pool.imap_unordered(play_game, jobs, chunksize=4)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run many headless Tetris games in parallel")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy")
+    parser.add_argument("--script", help="JSON file with a list of per-piece action lists")
+    parser.add_argument("--max-frames", type=int, default=LOGIC_RATE * 60 * 10)
+    parser.add_argument("--randomizer", choices=sorted(GENERATORS), default=RANDOMIZER)
+    parser.add_argument("--level-speeds", help='JSON object, e.g. {"0": 0.8, "1": 0.7}')
+    parser.add_argument("--lock-delay", type=float, default=LOCK_DELAY)
+    parser.add_argument("--das-delay", type=float, default=DAS_DELAY)
+    parser.add_argument("--arr-delay", type=float, default=ARR_DELAY)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    level_speeds = LEVEL_SPEEDS
+    if args.level_speeds:
+        level_speeds = fill_level_speeds(
+            {int(level): speed for level, speed in json.loads(args.level_speeds).items()}
+        )
+    script = None
+    if args.script:
+        with open(args.script) as file:
+            script = json.load(file)
+
+    jobs = (
+        GameJob(
+            seed=args.seed + idx,
+            policy=args.policy,
+            script=script,
+            max_frames=args.max_frames,
+            randomizer=args.randomizer,
+            level_speeds=level_speeds,
+            lock_delay=args.lock_delay,
+            das_delay=args.das_delay,
+            arr_delay=args.arr_delay,
+        )
+        for idx in range(args.games)
+    )
+
+    results = []
+    for result in run_batch(jobs, args.workers):
+        results.append(result)
+        print(json.dumps(result._asdict()), flush=True)
+
+    if results:
+        print(
+            f"games: {len(results)}, "
+            f"mean score: {mean(r.score for r in results):.1f}, "
+            f"mean lines: {mean(r.lines for r in results):.1f}, "
+            f"mean pieces: {mean(r.pieces for r in results):.1f}",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+from collections import deque
+from random import Random
+
+import pytest
+
+from board import Board
+from placements import enumerate_placements
+from shapes import SHAPE_TABLE, KICK_TABLE, spawn_x
+from tetromino import Tetromino
+
+from config import BOARD_SIZE, TETROMINOS
+
+
+def reference_placements(board, shape_name: str) -> set[frozenset]:
+    """Поиск в ширину с шагом в одну клетку: сдвиги, шаг вниз и повороты с wall kick"""
+    rotations = SHAPE_TABLE[shape_name]
+    kicks = KICK_TABLE[shape_name]
+    start = (spawn_x(shape_name, board.width), -1, 0)
+    if not board.fits(rotations[0], start[0], start[1]):
+        return set()
+
+    seen = {start}
+    queue = deque([start])
+    landed = set()
+    while queue:
+        x, y, rotation = queue.popleft()
+        moves = [(x - 1, y, rotation), (x + 1, y, rotation), (x, y + 1, rotation)]
+        for direction in (1, -1):
+            new_rotation = (rotation + direction) % 4
+            for kick_x, kick_y in kicks.get((rotation, new_rotation), ((0, 0),)):
+                if board.fits(rotations[new_rotation], x + kick_x, y + kick_y):
+                    moves.append((x + kick_x, y + kick_y, new_rotation))
+                    break
+        for state in moves:
+            if state not in seen and board.fits(rotations[state[2]], state[0], state[1]):
+                seen.add(state)
+                queue.append(state)
+        if not board.fits(rotations[rotation], x, y + 1):
+            landed.add(frozenset((x + col, y + row) for col, row in rotations[rotation].cells))
+    return landed
+
+
+def random_boards(count: int, seed: int = 5, fill: float = 0.55) -> list[Board]:
+    rng = Random(seed)
+    width, height = BOARD_SIZE
+    boards = []
+    for _ in range(count):
+        board = Board(BOARD_SIZE)
+        top = rng.randint(0, height - 4)
+        board.place([(x, y) for y in range(top, height) for x in range(width) if rng.random() < fill], 1)
+        boards.append(board)
+    return boards
+
+
+BOARDS = random_boards(150)
+
+
+@pytest.mark.parametrize("shape_name", TETROMINOS)
+def test_placements_match_reference(shape_name):
+    for idx, board in enumerate(BOARDS):
+        placements = enumerate_placements(board, shape_name)
+        assert {frozenset(placement.cells) for placement in placements} == reference_placements(
+            board, shape_name
+        ), idx
+
+
+@pytest.mark.parametrize("shape_name", TETROMINOS)
+def test_paths_lead_to_placement(shape_name):
+    for board in BOARDS[:50]:
+        for placement in enumerate_placements(board, shape_name):
+            tetromino = Tetromino(shape_name, board)
+            for step in placement.path:
+                if step == "left":
+                    assert tetromino.move(-1, 0)
+                elif step == "right":
+                    assert tetromino.move(1, 0)
+                elif step == "soft_drop":
+                    assert tetromino.move(0, 1)
+                elif step == "drop":
+                    tetromino.y += board.drop_distance(tetromino.shape, tetromino.x, tetromino.y)
+                else:
+                    assert tetromino.rotate(1 if step == "rotate_cw" else -1)
+            assert (tetromino.x, tetromino.y, tetromino.rotation) == (placement.x, placement.y, placement.rotation)
+            assert board.drop_distance(tetromino.shape, tetromino.x, tetromino.y) == 0
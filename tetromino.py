@@ -1,65 +1,124 @@
-from random import choice, randint
-
-import pygame
+from math import inf
+from time import perf_counter
 
 from config import (
-    WALL_KICK_DATA,
-    TETROMINOS, 
-    TETROMINOS_COLORS,
-    BOARD_LINE_THICKNESS,
     LEVEL_SPEEDS,
     LOCK_DELAY,
     MAX_LOCK_RESETS,
 )
+from shapes import SHAPE_TABLE, KICK_TABLE, CELL_CODES, GHOST_CODE, spawn_x
+
+
+# Поля состояния фигуры для snapshot/restore (без доски, часов и настроек)
+STATE_FIELDS = (
+    "shape_name",
+    "_level",
+    "x",
+    "y",
+    "rotation",
+    "fall_progress",
+    "last_fall",
+    "falling_delay",
+    "lock_resets",
+    "lock_start",
+)
 
 
 class Tetromino:
-    def __init__(self, shape_name: str, board, level: int = 0):
+    __slots__ = (
+        "shape_name",
+        "board",
+        "clock",
+        "level_speeds",
+        "lock_delay",
+        "code",
+        "_level",
+        "x",
+        "y",
+        "rotation",
+        "_drop_distance",
+        "_drop_version",
+        "fall_progress",
+        "last_fall",
+        "falling_delay",
+        "lock_resets",
+        "lock_start",
+    )
+
+    def __init__(
+        self,
+        shape_name: str,
+        board,
+        level: int = 0,
+        clock=perf_counter,
+        level_speeds: dict[int, float] = LEVEL_SPEEDS,
+        lock_delay: float = LOCK_DELAY,
+    ):
+        self.clock = clock
+        self.level_speeds = level_speeds
+        self.lock_delay = lock_delay
+        self.reset(shape_name, board, level)
+
+    def reset(self, shape_name: str, board, level: int = 0):
+        """Делает из фигуры новую, только что появившуюся - для TetrominoPool"""
         self.shape_name = shape_name
         self.board = board
-        self.block_size = board.block_size
-        self.color = TETROMINOS_COLORS[self.shape_name]
+        self.code = CELL_CODES[shape_name]
         self._level = level
-        
-        self.x, self.y = 0, 0
-        self.rotation = 0
+        # Кэш расстояния до места падения и версия поля, для которой он посчитан
+        self._drop_version = -1
         self.reset_position()
-        self.last_fall = pygame.time.get_ticks() / 1000
-        self.falling_delay = LEVEL_SPEEDS[level]
+        self.falling_delay = self.level_speeds[level]
         self.lock_resets = 0
         self.lock_start = 0
+
+    def snapshot(self) -> tuple:
+        return tuple(getattr(self, name) for name in STATE_FIELDS)
+
+    def restore(self, state: tuple, board):
+        for name, value in zip(STATE_FIELDS, state):
+            setattr(self, name, value)
+        self.board = board
+        self.code = CELL_CODES[self.shape_name]
+        self._drop_distance = None
+        self._drop_version = -1
     
     def is_valid_position(self, dx=0, dy=0, rotation=None):
         """Проверяет валидность позиции фигуры"""
         temp_rotation = rotation if rotation is not None else self.rotation
-        shape = TETROMINOS[self.shape_name][temp_rotation]
-        
-        for row_idx, row in enumerate(shape):
-            for col_idx, cell in enumerate(row):
-                if cell:
-                    new_x = self.x + col_idx + dx
-                    new_y = self.y + row_idx + dy
-                    
-                    # Проверка границ
-                    if new_x < 0 or new_x >= self.board.width or new_y >= self.board.height:
-                        return False
-                    # Проверка столкновений с другими блоками (если y >= 0)
-                    if new_y >= 0 and self.board.grid[new_y][new_x]:
-                        return False
-        return True
+        shape = SHAPE_TABLE[self.shape_name][temp_rotation]
+        return self.board.fits(shape, self.x + dx, self.y + dy)
     
+    def gravity(self, elapsed: float) -> float:
+        """Клеток падения за прошедшее время; при нулевой задержке - 20G"""
+        if self.falling_delay <= 0:
+            return inf
+        return elapsed / self.falling_delay
+
     def fall(self) -> tuple[bool, bool]:
-        current_time = pygame.time.get_ticks() / 1000
-        if current_time - self.last_fall >= self.falling_delay:
-            if not self.move(0, 1):
-                if self.lock_start == 0:
-                    self.lock_start = current_time
-                elif current_time - self.lock_start >= LOCK_DELAY:
-                    locked_above = self.lock()
-                    return True, locked_above  # Фигура зафиксирована
-                # return False, False  # Фигура не зафиксирована
-            self.last_fall = current_time
-        return False, False  # Фигура не зафиксирована
+        current_time = self.clock()
+        self.fall_progress += self.gravity(current_time - self.last_fall)
+        self.last_fall = current_time
+        if self.fall_progress < 1:
+            return False, False  # Фигура не зафиксирована
+
+        # Падение на несколько клеток за шаг - сразу на min(накоплено, до дна)
+        distance = self.drop_distance()
+        if distance:
+            cells = distance if self.fall_progress >= distance else int(self.fall_progress)
+            self.y += cells
+            self._drop_distance = distance - cells
+            self.check_lock_resets()
+            self.fall_progress = 0 if cells == distance else self.fall_progress - cells
+            return False, False
+
+        self.fall_progress = 0
+        if self.lock_start == 0:
+            self.lock_start = current_time
+        elif current_time - self.lock_start >= self.lock_delay:
+            locked_above = self.lock()
+            return True, locked_above  # Фигура зафиксирована
+        return False, False
 
     def rotate(self, direction=1):
         old_rotation = self.rotation
@@ -69,8 +128,7 @@ class Tetromino:
         transition = (old_rotation, self.rotation)
 
         # Получаем данные для wall kick
-        kick_data = WALL_KICK_DATA["I"] if self.shape_name == "I" else WALL_KICK_DATA["default"]
-        kicks = kick_data.get(transition, [(0, 0)])
+        kicks = KICK_TABLE[self.shape_name].get(transition, [(0, 0)])
 
         # Пробуем все возможные сдвиги
         for dx, dy in kicks:
@@ -78,6 +136,7 @@ class Tetromino:
             self.y = old_y + dy
 
             if self.is_valid_position():
+                self._drop_distance = None
                 self.check_lock_resets()
                 return True  # Вращение успешно
 
@@ -88,81 +147,77 @@ class Tetromino:
     
     def lock(self) -> bool:
         locked_above = False
+        cells = []
         for x, y in self.get_cells():
             if y < 0:
                 locked_above = True
                 continue
             if 0 <= x < self.board.width and 0 <= y < self.board.height:
-                self.board.grid[y][x] = 1  # Блок занят
-                self.board.colors[y][x] = self.color
+                cells.append((x, y))
+        self.board.place(cells, self.code)
         return locked_above
 
     def move(self, dx, dy) -> bool:
         if self.is_valid_position(dx, dy):
             self.x += dx
             self.y += dy
+            self._drop_distance = None
             self.check_lock_resets()
             return True
         return False
     
+    def lift(self, max_cells: int) -> bool:
+        """Поднимает фигуру, пока она пересекается с блоками (например, после мусора)"""
+        for _ in range(max_cells):
+            if self.is_valid_position():
+                return True
+            self.y -= 1
+        return self.is_valid_position()
+
+    def drop_distance(self) -> int:
+        if self._drop_distance is None or self._drop_version != self.board.version:
+            self._drop_distance = self.board.drop_distance(self.shape, self.x, self.y)
+            self._drop_version = self.board.version
+        return self._drop_distance
+
     def hard_drop(self) -> bool:
-        while self.move(0, 1):
-            pass
+        self.y += self.drop_distance()
+        self._drop_distance = None
         locked_above = self.lock()
         return locked_above
 
     def get_cells(self):
-        cells = []
-        shape = self.shape
-        for row_idx, row in enumerate(shape):
-            for col_idx, cell in enumerate(row):
-                if cell:
-                    cells.append((self.x + col_idx, self.y + row_idx))
-        return cells
+        x, y = self.x, self.y
+        return [(x + col_idx, y + row_idx) for col_idx, row_idx in self.shape.cells]
     
-    def _draw_block(self, surface: pygame.Surface, row_idx: int, col_idx: int, color: tuple[int, int, int]):
-        pygame.draw.rect(
-            surface,
-            color,
-            (
-                self.board.x + (self.x + col_idx) * self.block_size + BOARD_LINE_THICKNESS,
-                self.board.y + (self.y + row_idx) * self.block_size + BOARD_LINE_THICKNESS,
-                self.block_size - BOARD_LINE_THICKNESS,
-                self.block_size - BOARD_LINE_THICKNESS,
-            ),
-        )
-    
-    def draw(self, surface):
-        shape = self.shape
-        old_x, old_y = self.x, self.y
-
-        for row_idx, row in enumerate(shape):
-            for col_idx, cell in enumerate(row):
-                if cell:
-                    if self.y + row_idx >= 0:
-                        self._draw_block(surface, row_idx, col_idx, self.color)
-                    while self.is_valid_position(0, 1):
-                        self.y += 1
-                    if self.y == old_y:
-                        continue
-                    self._draw_block(surface, row_idx, col_idx, (128, 128, 128))
-                    self.x, self.y = old_x, old_y
+    def overlay(self) -> dict:
+        """Возвращает {(x, y): код клетки} для клеток фигуры и её тени внутри поля"""
+        cells = {}
+        ghost_offset = self.drop_distance()
+        if ghost_offset:
+            for x, y in self.get_cells():
+                if y + ghost_offset >= 0:
+                    cells[(x, y + ghost_offset)] = GHOST_CODE
+        for x, y in self.get_cells():
+            if y >= 0:
+                cells[(x, y)] = self.code
+        return cells
 
     @property
     def shape(self):
-        return TETROMINOS[self.shape_name][self.rotation]
+        return SHAPE_TABLE[self.shape_name][self.rotation]
     
     def reset_position(self, y: int = -1):
-        if self.shape_name == "O":
-            self.x = self.board.width // 2 - 1
-        else:
-            self.x = self.board.width // 2 - 2
+        self.x = spawn_x(self.shape_name, self.board.width)
         self.y = y
         self.rotation = 0
+        self._drop_distance = None
+        # Накопленное падение в клетках, дробная часть переходит на следующий шаг
+        self.fall_progress = 0
+        self.last_fall = self.clock()
 
     def swap_board(self, new_board, y: int = -1, board_reset: bool = False, lock: bool = False):
         self.board = new_board
-        self.block_size = new_board.block_size
         self.reset_position(y)
         if board_reset:
             self.board.reset()
@@ -173,9 +228,33 @@ class Tetromino:
         self.falling_delay = new_delay
 
     def reset_fall_delay(self):
-        self.falling_delay = LEVEL_SPEEDS[self._level]
+        self.falling_delay = self.level_speeds[self._level]
 
     def check_lock_resets(self):
         if self.lock_start != 0 and self.lock_resets < MAX_LOCK_RESETS:
-            self.lock_start = pygame.time.get_ticks() / 1000
+            self.lock_start = self.clock()
             self.lock_resets += 1
+
+
+class TetrominoPool:
+    """Переиспользует объекты фигур между появлениями.
+
+    Фигуру возвращают в пул через release, когда она зафиксирована и больше
+    нигде не хранится; acquire сначала берёт фигуру из пула.
+    """
+
+    def __init__(self, clock=perf_counter, level_speeds: dict[int, float] = LEVEL_SPEEDS, lock_delay: float = LOCK_DELAY):
+        self.clock = clock
+        self.level_speeds = level_speeds
+        self.lock_delay = lock_delay
+        self.free = []
+
+    def acquire(self, shape_name: str, board, level: int = 0) -> Tetromino:
+        if self.free:
+            tetromino = self.free.pop()
+            tetromino.reset(shape_name, board, level)
+            return tetromino
+        return Tetromino(shape_name, board, level, self.clock, self.level_speeds, self.lock_delay)
+
+    def release(self, tetromino: Tetromino):
+        self.free.append(tetromino)